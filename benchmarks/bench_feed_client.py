@@ -0,0 +1,83 @@
+"""
+Feed download against the local stand-in (local_feed_server): the previous bare requests.get + response.json()
+against FeedClient (persistent session, gzip, conditional requests, content-hash short-circuit, retries).
+
+Scenarios:
+    plain       - new connection and uncompressed body on every request
+    client      - same feed downloaded again: 304 Not Modified, nothing is parsed or ingested
+    no-etag     - the server sends no validators: full download, skipped by the content-hash
+    changing    - a new feed on every request: full download and parse every time
+                  (the time includes generating the feed on the server side)
+    retry       - the first two requests fail with 503 and are retried
+
+Usage (from the repository root):
+    python -m benchmarks.bench_feed_client --alerts 10000 --jams 5000 --requests 10
+"""
+import argparse
+import time
+
+import requests
+
+from benchmarks.local_feed_server import FeedState, start_server
+from queries.queries_feed_client import FeedClient
+from queries.queries_feed_stream import get_region_batches
+from region_routing import RegionRouter
+
+ROUTES = [{"region": "ALL", "db_config": None}]
+
+
+def run_plain(url, n_requests):
+    for _ in range(n_requests):
+        response = requests.get(url, headers={"Accept-Encoding": "identity"})
+        response.raise_for_status()
+        response.json()
+    return {"ingests": n_requests}
+
+
+def run_client(url, n_requests, client):
+    router = RegionRouter(ROUTES)
+    ingests = 0
+    for _ in range(n_requests):
+        batches, payload = get_region_batches(client, url, router, router.regions)
+        if batches is not None:
+            ingests += 1
+            client.commit(url, payload)
+    client.close()
+    return {"ingests": ingests, "requests": client.requests, "retried": client.retried,
+            "not modified": client.not_modified, "unchanged": client.unchanged}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--alerts", type=int, default=10000)
+    parser.add_argument("--jams", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=10)
+    args = parser.parse_args()
+
+    scenarios = [
+        ("plain", {}, lambda url: run_plain(url, args.requests)),
+        ("client", {}, lambda url: run_client(url, args.requests, FeedClient())),
+        ("no-etag", {"validators": False}, lambda url: run_client(url, args.requests, FeedClient())),
+        ("changing", {"change_every": 1}, lambda url: run_client(url, args.requests, FeedClient())),
+        ("retry", {"fail_first": 2},
+         lambda url: run_client(url, args.requests, FeedClient(backoff_seconds=0.05))),
+    ]
+
+    print(f"{'scenario':<10} {'seconds':>8} {'MiB sent':>9}  counters")
+    for name, options, run in scenarios:
+        state = FeedState(args.alerts, args.jams, **options)
+        server, url = start_server(state)
+        try:
+            start = time.perf_counter()
+            counters = run(url)
+            elapsed = time.perf_counter() - start
+        finally:
+            server.shutdown()
+            server.server_close()
+        counters["server requests"] = state.requests
+        print(f"{name:<10} {elapsed:>8.2f} {state.bytes_sent / 2 ** 20:>9.1f}  "
+              + ", ".join(f"{key} {value}" for key, value in counters.items()))
+
+
+if __name__ == "__main__":
+    main()
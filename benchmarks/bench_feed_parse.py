@@ -0,0 +1,74 @@
+"""
+Feed parsing benchmark: json.loads of the whole body followed by RegionRouter.split (route_feed_dict, what
+get_region_batches does) against parsing the body incrementally with ijson (C backend, kvitems of the root)
+followed by the same routing. Reports the best wall time and the peak of the Python allocations (tracemalloc)
+of one parse, the raw body is not counted in either.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_feed_parse --items 9000
+"""
+import argparse
+import io
+import json
+import time
+import tracemalloc
+
+import ijson
+
+from benchmarks.synthetic_feed import generate_feed
+from cons.CONF_REGIONS import REGION_ROUTES
+from cons.FEED_ULRS import FEED_URL_JMK
+from queries.queries_feed_stream import route_feed_dict
+from region_routing import RegionRouter
+
+
+def parse_loads(body, router):
+    return route_feed_dict(json.loads(body), router, router.regions)
+
+
+def parse_ijson(body, router):
+    data = {}
+    for key, value in ijson.kvitems(io.BytesIO(body), "", use_float=True):
+        if key in ("alerts", "jams"):
+            data[key] = value
+    return route_feed_dict(data, router, router.regions)
+
+
+def measure(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(timings), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=9000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # same alerts/jams ratio as the JMK feed usually has
+    data = generate_feed(n_alerts=args.items * 2 // 3, n_jams=args.items - args.items * 2 // 3)
+    body = json.dumps(data).encode()
+    router = RegionRouter(REGION_ROUTES[FEED_URL_JMK])
+
+    expected = parse_loads(body, router)
+    routed = parse_ijson(body, router)
+    for region, (alerts, jams) in expected.items():
+        assert (len(alerts), len(jams)) == tuple(len(items) for items in routed[region]), region
+
+    print(f"items: {args.items}, body: {len(body) / 2 ** 20:.1f} MiB, ijson backend: {ijson.backend}")
+    print(f"{'parser':<22} {'time':>10} {'peak memory':>14}")
+    for name, function in (("json.loads", parse_loads), ("ijson kvitems", parse_ijson)):
+        seconds, peak = measure(lambda: function(body, router), args.repeat)
+        print(f"{name:<22} {seconds * 1000:>7.1f} ms {peak / 2 ** 20:>10.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
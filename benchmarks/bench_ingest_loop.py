@@ -0,0 +1,165 @@
+"""
+Ingest loop harness: replays consecutive synthetic feed snapshots (synthetic_feed.generate_feed_cycles)
+through ingest_cycle of ingest_waze_data.py, the same function main_loop runs for every region, against
+a local database (docker-compose.yml), and reports per-stage latency percentiles and rows/sec of the cycle.
+
+Stages are the ones main_loop reports: change-detection cache split and touch (CHANGE_CACHE_ENABLED, off with
+--no-cache), segments extraction, the upserts of the ingest mode (--mode), the deactivation bounded by
+the DeactivationHorizon and the statistics of the python backend. The caches and the horizon are kept across
+the cycles like in the live loop.
+
+Without --commit all cycles run in one transaction that is rolled back at the end, so the database is left
+as it was (now() is then the same for every cycle and nothing gets deactivated). With --commit every cycle
+is committed like in the live loop, use it only on a throwaway database.
+
+The results can be saved with --output and compared with a saved run with --baseline, the exit code is 1
+when the p50 of a stage is slower than the baseline by more than --tolerance.
+
+Usage (from the repository root, with the database from docker-compose.yml running):
+    python -m benchmarks.bench_ingest_loop --alerts 10000 --jams 5000 --cycles 20 --output baseline.json
+    python -m benchmarks.bench_ingest_loop --alerts 10000 --jams 5000 --cycles 20 --baseline baseline.json
+"""
+import argparse
+import json
+import math
+import sys
+import time
+from collections import defaultdict
+
+from benchmarks.synthetic_feed import generate_feed_cycles
+from cons.CONF_DB import DB_CONFIG_BRNO
+from cons.CONF_INGEST import (INGEST_MODE, CHANGE_CACHE_ENABLED, CHANGE_CACHE_MAX_SIZE, DEACTIVATION_WINDOW_SECONDS,
+                              DEACTIVATION_FULL_PASS_SECONDS)
+from ingest_waze_data import ingest_cycle
+from queries.QUERIES import PREPARE_UPSERTS_QUERY
+from queries.queries_feed_cache import FeedChangeCache
+from queries.queries_functions import DeactivationHorizon
+from queries.queries_inserting_data import connect
+
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(values, q):
+    """
+    Nearest-rank percentile.
+    """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+class StageTimer:
+    """
+    Collects the duration and the number of rows of every run of every stage.
+    """
+
+    def __init__(self):
+        self.seconds = defaultdict(list)
+        self.rows = defaultdict(int)
+
+    def add(self, stage, seconds, rows=0):
+        self.seconds[stage].append(seconds)
+        self.rows[stage] += rows
+
+    def summary(self):
+        summary = {}
+        for stage, seconds in self.seconds.items():
+            total = sum(seconds)
+            summary[stage] = {f"p{q}": percentile(seconds, q) for q in PERCENTILES}
+            summary[stage]["max"] = max(seconds)
+            summary[stage]["rows_per_sec"] = self.rows[stage] / total if total and self.rows[stage] else None
+        return summary
+
+
+def run_cycle(cursor, feed, mode, caches, horizon, timer):
+    alerts, jams = feed["alerts"], feed["jams"]
+    cycle_start = time.perf_counter()
+    stages, _, committed = ingest_cycle(cursor, alerts, jams, caches, horizon, mode=mode)
+    cycle_seconds = time.perf_counter() - cycle_start
+    committed()
+
+    for stage, seconds in stages.items():
+        timer.add(stage, seconds)
+    timer.add("cycle", cycle_seconds, len(alerts) + len(jams))
+
+
+def print_summary(summary, baseline=None):
+    print(f"{'stage':<18} " + " ".join(f"{f'p{q} ms':>10}" for q in PERCENTILES)
+          + f" {'max ms':>10} {'rows/sec':>12}" + (f" {'p50 vs baseline':>16}" if baseline else ""))
+    for stage, values in summary.items():
+        line = (f"{stage:<18} " + " ".join(f"{values[f'p{q}'] * 1000:>10.1f}" for q in PERCENTILES)
+                + f" {values['max'] * 1000:>10.1f} "
+                + (f"{values['rows_per_sec']:>12.0f}" if values["rows_per_sec"] else f"{'-':>12}"))
+        if baseline and stage in baseline:
+            line += f" {(values['p50'] / baseline[stage]['p50'] - 1) * 100:>+15.1f}%"
+        print(line)
+
+
+def regressions(summary, baseline, tolerance):
+    return [stage for stage, values in summary.items()
+            if stage in baseline and values["p50"] > baseline[stage]["p50"] * (1 + tolerance)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--alerts", type=int, default=10000)
+    parser.add_argument("--jams", type=int, default=5000)
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--churn", type=float, default=0.05, help="fraction of items replaced every cycle")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mode", choices=["row", "prepared", "batch", "copy"], default=INGEST_MODE)
+    parser.add_argument("--no-cache", action="store_true", help="run without the change-detection cache")
+    parser.add_argument("--commit", action="store_true", help="commit every cycle (throwaway database only)")
+    parser.add_argument("--output", help="save the results as JSON")
+    parser.add_argument("--baseline", help="JSON saved with --output to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p50 slowdown against the baseline")
+    args = parser.parse_args()
+
+    # generated up front, the generator is not part of the measured time
+    feeds = list(generate_feed_cycles(args.alerts, args.jams, args.cycles, churn=args.churn, seed=args.seed))
+
+    # in-process state of one region, kept across the cycles as in ingest_waze_data.py
+    caches = {table: FeedChangeCache(table, max_size=CHANGE_CACHE_MAX_SIZE, ttl_seconds=DEACTIVATION_WINDOW_SECONDS)
+              for table in ("alerts", "jams")} if CHANGE_CACHE_ENABLED and not args.no_cache else None
+    horizon = DeactivationHorizon(DEACTIVATION_FULL_PASS_SECONDS)
+
+    timer = StageTimer()
+    conn = connect(DB_CONFIG_BRNO)
+    try:
+        with conn.cursor() as cursor:
+            if args.mode == "prepared":
+                cursor.execute(PREPARE_UPSERTS_QUERY)
+            for feed in feeds:
+                run_cycle(cursor, feed, args.mode, caches, horizon, timer)
+                if args.commit:
+                    conn.commit()
+    finally:
+        conn.rollback()
+        conn.close()
+
+    summary = timer.summary()
+    config = {key: getattr(args, key)
+              for key in ("alerts", "jams", "cycles", "churn", "seed", "mode", "no_cache", "commit")}
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            saved = json.load(f)
+        if saved["config"] != config:
+            print(f"Warning: baseline was measured with {saved['config']}")
+        baseline = saved["stages"]
+
+    print(f"{args.cycles} cycles, {args.alerts} alerts and {args.jams} jams per feed, mode '{args.mode}'")
+    print_summary(summary, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": config, "stages": summary}, f, indent=2)
+
+    if baseline:
+        slower = regressions(summary, baseline, args.tolerance)
+        if slower:
+            print(f"Regression against the baseline (p50 > +{args.tolerance:.0%}): {', '.join(slower)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
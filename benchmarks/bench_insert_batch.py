@@ -0,0 +1,63 @@
+"""
+Compares rows/sec of the per-row upserts (insert_alerts, insert_jams) with the batched
+ones (insert_alerts_batch, insert_jams_batch) and the COPY staging loader (ingest_feed_copy)
+on a synthetic feed.
+
+Every run is done in its own transaction that is rolled back, so the database is left as it was.
+
+Usage (from the repository root, with the database from docker-compose.yml running):
+    python -m benchmarks.bench_insert_batch --alerts 10000 --jams 5000
+"""
+import argparse
+import time
+
+from benchmarks.synthetic_feed import generate_feed
+from cons.CONF_DB import DB_CONFIG_BRNO
+from queries.queries_inserting_data import (connect, insert_alerts, insert_jams, insert_alerts_batch,
+                                            insert_jams_batch, extract_segments_from_jams)
+from queries.queries_staging_data import ingest_feed_copy
+
+
+def timed_run(db_config, insert_function, items):
+    conn = connect(db_config)
+    try:
+        with conn.cursor() as cursor:
+            start = time.perf_counter()
+            insert_function(cursor, items)
+            elapsed = time.perf_counter() - start
+    finally:
+        conn.rollback()
+        conn.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--alerts", type=int, default=10000)
+    parser.add_argument("--jams", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    feed = generate_feed(args.alerts, args.jams, seed=args.seed)
+
+    cases = [
+        ("alerts", "per-row", insert_alerts, feed["alerts"]),
+        ("alerts", "batch", insert_alerts_batch, feed["alerts"]),
+        ("jams", "per-row", insert_jams, feed["jams"]),
+        ("jams", "batch", insert_jams_batch, feed["jams"]),
+        ("jams", "copy", lambda cursor, jams: ingest_feed_copy(cursor, [], jams, []), feed["jams"]),
+        ("alerts", "copy", lambda cursor, alerts: ingest_feed_copy(cursor, alerts, [], []), feed["alerts"]),
+        ("all", "copy",
+         lambda cursor, _: ingest_feed_copy(cursor, feed["alerts"], feed["jams"],
+                                            extract_segments_from_jams(feed["jams"])),
+         feed["alerts"] + feed["jams"]),
+    ]
+
+    print(f"{'table':<8} {'mode':<8} {'rows':>8} {'seconds':>10} {'rows/sec':>12}")
+    for table, mode, insert_function, items in cases:
+        elapsed = timed_run(DB_CONFIG_BRNO, insert_function, items)
+        print(f"{table:<8} {mode:<8} {len(items):>8} {elapsed:>10.3f} {len(items) / elapsed:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Jam geometry encoding microbenchmark on synthetic jams: the previous path (shapely LineString -> WKT text,
+parsed by ST_GeomFromText on the server) against EWKB bytes built directly from the line points
+(helpers.linestring_ewkb, read by ST_GeomFromEWKB). Only the client side is measured.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_jam_geometry --jams 10000
+"""
+import argparse
+import time
+
+from shapely.geometry import LineString
+
+from benchmarks.synthetic_feed import generate_feed
+from helpers import linestring_ewkb
+
+
+def encode_wkt(jams):
+    return [LineString([(pt["x"], pt["y"]) for pt in jam["line"]]).wkt for jam in jams]
+
+
+def encode_ewkb(jams):
+    return [linestring_ewkb(jam["line"]) for jam in jams]
+
+
+def best_of(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jams", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    jams = generate_feed(n_alerts=0, n_jams=args.jams)["jams"]
+
+    wkt_seconds, wkt = best_of(lambda: encode_wkt(jams), args.repeat)
+    ewkb_seconds, ewkb = best_of(lambda: encode_ewkb(jams), args.repeat)
+
+    print(f"jams: {args.jams}")
+    print(f"WKT:  {wkt_seconds * 1000:8.1f} ms, {sum(len(text) for text in wkt) / 1024:8.0f} KiB of text")
+    print(f"EWKB: {ewkb_seconds * 1000:8.1f} ms, {sum(len(data) for data in ewkb) / 1024:8.0f} KiB of bytes "
+          f"(sent hex encoded, 2x on the wire)")
+
+
+if __name__ == "__main__":
+    main()
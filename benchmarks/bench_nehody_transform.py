@@ -0,0 +1,101 @@
+"""
+EPSG:5514 -> 4326 transformation of the accident points (load_nehody in new_data_brno_loader/loader.py)
+on synthetic S-JTSK points:
+
+    per-point  - transformer.transform(x, y) once per feature (the original loader)
+    chunked    - one array call per NEHODY_CHUNK_SIZE points ("client", the default)
+    + geog     - chunked, including the EWKT formatting of geog that COPY needed before the points
+                 were built with ST_MakePoint
+    server     - ST_Transform(ST_MakePoint(x, y), 4326)::geography in PostGIS ("server"), with --db only:
+                 x/y copied to a temporary table, then transformed by one INSERT ... SELECT
+
+Usage (from the repository root, --db needs the database from docker-compose.yml):
+    python -m benchmarks.bench_nehody_transform --points 500000 [--db]
+"""
+import argparse
+import time
+
+import numpy as np
+from pyproj import Transformer
+
+from cons.CONF_DB import DB_CONFIG_BRNO
+from queries.queries_inserting_data import connect
+from queries.queries_staging_data import copy_records
+
+CHUNK_SIZE = 10000
+
+# Rough bounding box of Jihomoravsky kraj in S-JTSK (EPSG:5514)
+MIN_X, MAX_X = -650000.0, -520000.0
+MIN_Y, MAX_Y = -1230000.0, -1120000.0
+
+SERVER_SETUP_QUERY = """
+    CREATE TEMP TABLE points_5514 (x FLOAT, y FLOAT);
+    CREATE TEMP TABLE points_4326 (geog GEOGRAPHY(POINT, 4326));
+"""
+
+SERVER_TRANSFORM_QUERY = """
+    INSERT INTO points_4326 SELECT ST_Transform(ST_SetSRID(ST_MakePoint(x, y), 5514), 4326)::geography
+    FROM points_5514;
+"""
+
+
+def per_point(transformer, xs, ys):
+    return [transformer.transform(x, y) for x, y in zip(xs.tolist(), ys.tolist())]
+
+
+def chunked(transformer, xs, ys, with_geog=False):
+    result = []
+    for start in range(0, len(xs), CHUNK_SIZE):
+        lons, lats = transformer.transform(xs[start:start + CHUNK_SIZE], ys[start:start + CHUNK_SIZE])
+        if with_geog:
+            result.extend(f'SRID=4326;POINT({lon} {lat})' for lon, lat in zip(lons.tolist(), lats.tolist()))
+        else:
+            result.append((lons, lats))
+    return result
+
+
+def server(xs, ys):
+    conn = connect(DB_CONFIG_BRNO)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(SERVER_SETUP_QUERY)
+            copy_records(cursor, "points_5514", ["x", "y"], zip(xs.tolist(), ys.tolist()))
+            start = time.perf_counter()
+            cursor.execute(SERVER_TRANSFORM_QUERY)
+            return time.perf_counter() - start
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=500000)
+    parser.add_argument("--db", action="store_true", help="measure ST_Transform in the database as well")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    xs = rng.uniform(MIN_X, MAX_X, args.points)
+    ys = rng.uniform(MIN_Y, MAX_Y, args.points)
+    transformer = Transformer.from_crs("EPSG:5514", "EPSG:4326", always_xy=True)
+
+    cases = [
+        ("per-point", lambda: per_point(transformer, xs, ys)),
+        ("chunked", lambda: chunked(transformer, xs, ys)),
+        ("chunked + geog", lambda: chunked(transformer, xs, ys, with_geog=True)),
+    ]
+
+    print(f"{'case':<16} {'seconds':>8} {'points/sec':>12}")
+    for name, run in cases:
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        print(f"{name:<16} {elapsed:>8.2f} {args.points / elapsed:>12.0f}")
+
+    if args.db:
+        elapsed = server(xs, ys)
+        print(f"{'server':<16} {elapsed:>8.2f} {args.points / elapsed:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Routing stage benchmark: the original four list comprehensions over the JMK feed (city == / != 'Brno')
+against the single-pass RegionRouter.split (route_feed_dict, the non-streaming path) with the routes from
+cons/CONF_REGIONS.py, and the same comparison with one region per city of the synthetic feed (two list
+comprehensions per region).
+The spatial mode is measured with a polygon around Brno instead of the administrative boundary.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_region_routing --items 100000
+"""
+import argparse
+import time
+
+from benchmarks.synthetic_feed import generate_feed, CITIES
+from cons.CONF_REGIONS import REGION_ROUTES
+from cons.FEED_ULRS import FEED_URL_JMK
+from queries.queries_feed_stream import route_feed_dict
+from region_routing import RegionRouter
+
+
+def route_list_comprehensions(data):
+    alerts_brno_jmk = data.get("alerts", [])
+    jams_brno_jmk = data.get("jams", [])
+    alerts_brno = [alert for alert in alerts_brno_jmk if alert.get('city') == 'Brno']
+    jams_brno = [jam for jam in jams_brno_jmk if jam.get('city') == 'Brno']
+    alerts_jmk = [alert for alert in alerts_brno_jmk if alert.get('city') != 'Brno']
+    jams_jmk = [jam for jam in jams_brno_jmk if jam.get('city') != 'Brno']
+    return {"BRNO": (alerts_brno, jams_brno), "JMK": (alerts_jmk, jams_jmk)}
+
+
+def route_list_comprehensions_per_city(data, cities):
+    return {city: ([alert for alert in data["alerts"] if alert.get('city') == city],
+                   [jam for jam in data["jams"] if jam.get('city') == city])
+            for city in cities}
+
+
+def route_router(data, router):
+    return route_feed_dict(data, router, router.regions)
+
+
+def best_of(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # same alerts/jams ratio as the JMK feed usually has
+    data = generate_feed(n_alerts=args.items * 2 // 3, n_jams=args.items - args.items * 2 // 3)
+    router = RegionRouter(REGION_ROUTES[FEED_URL_JMK])
+
+    comprehension_seconds, expected = best_of(lambda: route_list_comprehensions(data), args.repeat)
+    router_seconds, routed = best_of(lambda: route_router(data, router), args.repeat)
+
+    for region, (alerts, jams) in expected.items():
+        assert (len(alerts), len(jams)) == tuple(len(items) for items in routed[region]), region
+
+    cities = [city for city in dict.fromkeys(CITIES) if city is not None]
+    city_router = RegionRouter([{"region": city, "city": [city]} for city in cities])
+    city_comprehension_seconds, _ = best_of(lambda: route_list_comprehensions_per_city(data, cities), args.repeat)
+    city_router_seconds, _ = best_of(lambda: route_router(data, city_router), args.repeat)
+
+    brno_polygon = [(16.43, 49.11), (16.73, 49.11), (16.73, 49.29), (16.43, 49.29)]
+    spatial_router = RegionRouter([{"region": "BRNO", "polygon": brno_polygon}, {"region": "JMK"}], mode="spatial")
+    spatial_seconds, _ = best_of(lambda: route_router(data, spatial_router), args.repeat)
+
+    print(f"items: {args.items}")
+    print(f"{'routes':<22} {'list comprehensions':>20} {'RegionRouter':>14}")
+    print(f"{'BRNO / JMK':<22} {comprehension_seconds * 1000:>17.1f} ms {router_seconds * 1000:>11.1f} ms")
+    print(f"{f'{len(cities)} city regions':<22} {city_comprehension_seconds * 1000:>17.1f} ms "
+          f"{city_router_seconds * 1000:>11.1f} ms")
+    print(f"{'BRNO / JMK spatial':<22} {'-':>20} {spatial_seconds * 1000:>11.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Compares the two statistics backends (STATISTICS_BACKEND in cons/CONF_INGEST.py):
+
+- dashboard query latency: hourly statistics for the last --days days read from sum_statistics
+  (python backend) and from the view published_statistics_cagg (timescale backend). Only the latency
+  is comparable, the view counts jams/alerts published during the hour, not active during it.
+- statistics time added to one ingest cycle: run_statistics_incremental (python backend) and
+  a refresh of the continuous aggregates over the policy window (timescale backend, done by
+  a background job and not by the ingest loop)
+
+The continuous aggregates are created first when they do not exist (create_statistics_caggs, what the ingest
+does on startup with the timescale backend). The python backend run is rolled back, the continuous aggregate
+refresh is kept (it is what the refresh policy would do anyway).
+
+Usage (from the repository root):
+    python -m benchmarks.bench_statistics_backends --days 30 --repeat 20
+"""
+import argparse
+import statistics
+import time
+
+from cons.CONF_DB import DB_CONFIG_BRNO
+from queries.queries_functions import run_statistics_incremental, create_statistics_caggs
+from queries.queries_inserting_data import connect
+
+DASHBOARD_QUERY = """
+    SELECT stat_time, {totals}, avg_speed_kmh, avg_jam_length, avg_delay, avg_jam_level
+    FROM {source}
+    WHERE stat_time >= now() - %s * INTERVAL '1 day'
+    ORDER BY stat_time;
+    """
+
+# source -> count columns
+DASHBOARD_SOURCES = {
+    "sum_statistics": "total_active_jams, total_active_alerts",
+    "published_statistics_cagg": "total_published_jams, total_published_alerts",
+}
+
+REFRESH_QUERY = "CALL refresh_continuous_aggregate(%s, now() - INTERVAL '3 days', now() - INTERVAL '1 hour');"
+
+
+def time_query(cursor, query, params, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cursor.execute(query, params)
+        cursor.fetchall()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name, timings):
+    print(f"{name:<40} median {statistics.median(timings) * 1000:>9.2f} ms   "
+          f"max {max(timings) * 1000:>9.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    conn = connect(DB_CONFIG_BRNO)
+    try:
+        with conn.cursor() as cursor:
+            create_statistics_caggs(cursor)
+            conn.commit()
+
+            for source, totals in DASHBOARD_SOURCES.items():
+                report(f"dashboard {source}", time_query(cursor, DASHBOARD_QUERY.format(source=source, totals=totals),
+                                                         (args.days,), args.repeat))
+
+            start = time.perf_counter()
+            hours = run_statistics_incremental(cursor)
+            report(f"cycle python backend ({hours} hours)", [time.perf_counter() - start])
+            conn.rollback()
+
+            # refresh_continuous_aggregate can not run inside a transaction block
+            conn.autocommit = True
+            for view in ("jam_hourly_stats", "alert_hourly_stats"):
+                start = time.perf_counter()
+                cursor.execute(REFRESH_QUERY, (view,))
+                report(f"refresh {view} (background job)", [time.perf_counter() - start])
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Compares the per-hour statistics calculation (the calculate_statistics_step queries for every hour)
+with the set-based one (SUM_STATISTICS_RANGE_SELECT), both with the configured STATISTICS_QUERY_MODE,
+on the data already in the database and checks that both give the same numbers. Nothing is written to sum_statistics.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_statistics_backfill --from "25.04.2024 00:00" --to "25.05.2024 00:00"
+"""
+import argparse
+import math
+import time
+from datetime import datetime, timedelta
+
+from cons.CONF_DB import DB_CONFIG_BRNO
+from helpers import round_to_hour
+from cons.CONF_INGEST import STATISTICS_QUERY_MODE
+from queries.queries_functions import fetch_statistics_range, fetch_statistics_step
+from queries.queries_inserting_data import connect
+
+
+def fetch_statistics_per_hour(cursor, start_time, end_time):
+    rows = []
+    while start_time < end_time:
+        jam_stats, alert_stats = fetch_statistics_step(cursor, start_time)
+        # same normalization as insert_sum_statistics
+        rows.append((start_time, jam_stats[0] or 0, alert_stats[0] or 0, jam_stats[1] or 0,
+                     jam_stats[2] or 0, jam_stats[3] or 0, jam_stats[4] or 0))
+        start_time += timedelta(hours=1)
+    return rows
+
+
+def compare(per_hour_rows, set_based_rows):
+    differences = 0
+    for per_hour, set_based in zip(per_hour_rows, set_based_rows):
+        values_match = all(math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9)
+                           for a, b in zip(per_hour[1:], set_based[1:]))
+        if not values_match:
+            differences += 1
+            print(f"DIFF {per_hour[0]}: per-hour {per_hour[1:]} set-based {set_based[1:]}")
+    if len(per_hour_rows) != len(set_based_rows):
+        differences += 1
+        print(f"DIFF number of hours: per-hour {len(per_hour_rows)} set-based {len(set_based_rows)}")
+    return differences
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from", dest="start", required=True, help="'DD.MM.YYYY HH:MM'")
+    parser.add_argument("--to", dest="end", required=True, help="'DD.MM.YYYY HH:MM'")
+    args = parser.parse_args()
+
+    start_time = round_to_hour(datetime.strptime(args.start, "%d.%m.%Y %H:%M"))
+    end_time = round_to_hour(datetime.strptime(args.end, "%d.%m.%Y %H:%M"))
+
+    conn = connect(DB_CONFIG_BRNO)
+    try:
+        with conn.cursor() as cursor:
+            started = time.perf_counter()
+            per_hour_rows = fetch_statistics_per_hour(cursor, start_time, end_time)
+            per_hour_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            set_based_rows = fetch_statistics_range(cursor, start_time, end_time)
+            set_based_seconds = time.perf_counter() - started
+    finally:
+        conn.rollback()
+        conn.close()
+
+    print(f"mode:      {STATISTICS_QUERY_MODE}")
+    print(f"hours:     {len(per_hour_rows)}")
+    print(f"per-hour:  {per_hour_seconds:.2f} s")
+    print(f"set-based: {set_based_seconds:.2f} s")
+    differences = compare(per_hour_rows, set_based_rows)
+    print("results match" if not differences else f"{differences} differing hour(s)")
+
+
+if __name__ == "__main__":
+    main()
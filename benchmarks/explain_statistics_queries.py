@@ -0,0 +1,51 @@
+"""
+Captures EXPLAIN (ANALYZE, BUFFERS) of the hourly statistics queries for one hour, the original
+overlap predicate (JAM_HOURLY_QUERY/ALERT_HOURLY_QUERY) before and the bounded one
+(JAM_HOURLY_BOUNDED_QUERY/ALERT_HOURLY_BOUNDED_QUERY) after.
+
+Usage (from the repository root):
+    python -m benchmarks.explain_statistics_queries --hour "01.05.2025 17:00" > explain.txt
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from cons.CONF_DB import DB_CONFIG_BRNO
+from cons.CONF_INGEST import STATISTICS_LOOKBACK
+from helpers import round_to_hour
+from queries.QUERIES import JAM_HOURLY_QUERY, ALERT_HOURLY_QUERY, JAM_HOURLY_BOUNDED_QUERY, ALERT_HOURLY_BOUNDED_QUERY
+from queries.queries_inserting_data import connect
+
+
+def explain(cursor, title, query, params):
+    cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + query, params)
+    print(f"===== {title} =====")
+    for row in cursor.fetchall():
+        print(row[0])
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hour", required=True, help="'DD.MM.YYYY HH:MM'")
+    parser.add_argument("--lookback", default=STATISTICS_LOOKBACK)
+    args = parser.parse_args()
+
+    start_time = round_to_hour(datetime.strptime(args.hour, "%d.%m.%Y %H:%M"))
+    end_time = start_time + timedelta(hours=1)
+    overlap_params = (start_time, end_time, start_time, start_time)
+    bounded_params = {"start": start_time, "end": end_time, "lookback": args.lookback}
+
+    conn = connect(DB_CONFIG_BRNO)
+    try:
+        with conn.cursor() as cursor:
+            explain(cursor, "jams, overlap (before)", JAM_HOURLY_QUERY, overlap_params)
+            explain(cursor, "jams, bounded (after)", JAM_HOURLY_BOUNDED_QUERY, bounded_params)
+            explain(cursor, "alerts, overlap (before)", ALERT_HOURLY_QUERY, overlap_params)
+            explain(cursor, "alerts, bounded (after)", ALERT_HOURLY_BOUNDED_QUERY, bounded_params)
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Local HTTP stand-in of the Waze partner feed, serves a synthetic feed (synthetic_feed.generate_feed).
+
+Like the partner hub it answers with gzip when asked, and optionally with ETag/Last-Modified validators
+(304 Not Modified on a conditional request), a new feed every --change-every requests and 503 errors
+on the first --fail-first requests, so the feed client can be exercised without the network.
+
+Usage (from the repository root):
+    python -m benchmarks.local_feed_server --port 8765 --alerts 10000 --jams 5000
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.synthetic_feed import generate_feed
+
+
+class FeedState:
+    """
+    Current payload of the stand-in and the request counters.
+    """
+
+    def __init__(self, n_alerts, n_jams, change_every=0, fail_first=0, validators=True):
+        self.n_alerts = n_alerts
+        self.n_jams = n_jams
+        self.change_every = change_every
+        self.fail_first = fail_first
+        self.validators = validators
+
+        self.requests = 0
+        self.not_modified = 0
+        self.failed = 0
+        self.bytes_sent = 0
+        self.version = 0
+        self._lock = threading.Lock()
+        self._build()
+
+    def _build(self):
+        feed = generate_feed(self.n_alerts, self.n_jams, seed=self.version)
+        self.body = json.dumps(feed).encode("utf-8")
+        self.gzip_body = gzip.compress(self.body, compresslevel=6)
+        self.etag = '"' + hashlib.blake2b(self.body, digest_size=8).hexdigest() + '"'
+        self.last_modified = formatdate(usegmt=True)
+
+    def next_request(self):
+        """
+        Counts the request, switches to a new feed when it is time.
+
+        :return: True when the request should fail
+        """
+        with self._lock:
+            self.requests += 1
+            if self.requests <= self.fail_first:
+                self.failed += 1
+                return True
+            if self.change_every and (self.requests - self.fail_first) % self.change_every == 0:
+                self.version += 1
+                self._build()
+            return False
+
+
+def make_handler(state):
+
+    class FeedHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if state.next_request():
+                self.send_response(503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            if state.validators:
+                if_none_match = self.headers.get("If-None-Match")
+                if if_none_match == state.etag or (if_none_match is None
+                                                   and self.headers.get("If-Modified-Since") == state.last_modified):
+                    state.not_modified += 1
+                    self.send_response(304)
+                    self.send_header("ETag", state.etag)
+                    self.end_headers()
+                    return
+
+            body = state.body
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                body = state.gzip_body
+                self.send_header("Content-Encoding", "gzip")
+            if state.validators:
+                self.send_header("ETag", state.etag)
+                self.send_header("Last-Modified", state.last_modified)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            state.bytes_sent += len(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FeedHandler
+
+
+def start_server(state, host="127.0.0.1", port=0):
+    """
+    Starts the stand-in in a background thread.
+
+    :return: tuple (server, feed url), server.shutdown() stops it
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/feed"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--alerts", type=int, default=10000)
+    parser.add_argument("--jams", type=int, default=5000)
+    parser.add_argument("--change-every", type=int, default=0, help="new feed every N requests, 0 = never")
+    parser.add_argument("--fail-first", type=int, default=0, help="answer 503 to the first N requests")
+    parser.add_argument("--no-validators", action="store_true", help="no ETag/Last-Modified, never 304")
+    args = parser.parse_args()
+
+    state = FeedState(args.alerts, args.jams, change_every=args.change_every, fail_first=args.fail_first,
+                      validators=not args.no_validators)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    print(f"Serving the synthetic feed at http://{args.host}:{args.port}/feed")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
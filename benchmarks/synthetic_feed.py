@@ -0,0 +1,133 @@
+"""
+Synthetic Waze partner feed payloads in the same schema as FEED_URL_JMK returns.
+Used by the benchmarks, nothing here talks to the network or the database.
+"""
+import random
+import time
+import uuid
+
+# Rough bounding box of Jihomoravsky kraj (lon/lat)
+MIN_X, MAX_X = 15.54, 17.65
+MIN_Y, MAX_Y = 48.61, 49.63
+
+CITIES = ["Brno", "Brno", "Brno", "Blansko", "Břeclav", "Hodonín", "Vyškov", "Znojmo", None]
+STREETS = ["Husova", "Kounicova", "Vídeňská", "Křenová", "D1", "Dukelská třída", "Lidická", None]
+ALERT_TYPES = [
+    ("JAM", "JAM_HEAVY_TRAFFIC"),
+    ("ACCIDENT", "ACCIDENT_MINOR"),
+    ("HAZARD", "HAZARD_ON_ROAD_CAR_STOPPED"),
+    ("ROAD_CLOSED", "ROAD_CLOSED_EVENT"),
+    ("WEATHERHAZARD", ""),
+]
+
+
+def _point(rng):
+    return {"x": round(rng.uniform(MIN_X, MAX_X), 6), "y": round(rng.uniform(MIN_Y, MAX_Y), 6)}
+
+
+def generate_alert(rng, now_millis):
+    alert_type, subtype = rng.choice(ALERT_TYPES)
+    return {
+        "country": "EZ",
+        "city": rng.choice(CITIES),
+        "reportRating": rng.randint(0, 5),
+        "reportByMunicipalityUser": rng.choice(["true", "false"]),
+        "confidence": rng.randint(0, 5),
+        "reliability": rng.randint(0, 10),
+        "type": alert_type,
+        "uuid": str(uuid.UUID(int=rng.getrandbits(128))),
+        "roadType": rng.randint(1, 7),
+        "magvar": rng.randint(0, 359),
+        "subtype": subtype,
+        "street": rng.choice(STREETS),
+        "reportDescription": rng.choice([None, "Nehoda v pravom pruhu"]),
+        "location": _point(rng),
+        "pubMillis": now_millis - rng.randint(0, 6 * 3600 * 1000),
+    }
+
+
+def generate_jam(rng, now_millis, points_per_jam=12, segments_per_jam=6):
+    start = _point(rng)
+    line = [start]
+    for _ in range(points_per_jam - 1):
+        line.append({"x": round(line[-1]["x"] + rng.uniform(-0.001, 0.001), 6),
+                     "y": round(line[-1]["y"] + rng.uniform(-0.001, 0.001), 6)})
+    segments = [{"fromNode": rng.randint(1, 10 ** 8), "ID": rng.randint(1, 10 ** 9),
+                 "toNode": rng.randint(1, 10 ** 8), "isForward": rng.choice([True, False])}
+                for _ in range(segments_per_jam)]
+    return {
+        "country": "EZ",
+        "city": rng.choice(CITIES),
+        "level": rng.randint(1, 5),
+        "speedKMH": round(rng.uniform(0, 40), 2),
+        "length": rng.randint(50, 5000),
+        "turnType": "NONE",
+        "uuid": rng.randint(1, 2 ** 31 - 1),
+        "endNode": rng.choice(STREETS),
+        "speed": round(rng.uniform(0, 11), 3),
+        "segments": segments,
+        "roadType": rng.randint(1, 7),
+        "delay": rng.randint(-1, 900),
+        "street": rng.choice(STREETS),
+        "id": rng.randint(1, 2 ** 62),
+        "line": line,
+        "pubMillis": now_millis - rng.randint(0, 3 * 3600 * 1000),
+        "blockingAlertUuid": None,
+    }
+
+
+def generate_feed(n_alerts=10000, n_jams=5000, seed=42, now_millis=None):
+    """
+    Generates one feed snapshot with n_alerts alerts and n_jams jams.
+
+    :param n_alerts: number of alerts
+    :param n_jams: number of jams
+    :param seed: seed of the random generator, same seed gives the same feed
+    :param now_millis: time of the snapshot in milliseconds, defaults to now
+    :return: dict with the same keys as the Waze partner feed
+    """
+    rng = random.Random(seed)
+    if now_millis is None:
+        now_millis = int(time.time() * 1000)
+    return {
+        "alerts": [generate_alert(rng, now_millis) for _ in range(n_alerts)],
+        "jams": [generate_jam(rng, now_millis) for _ in range(n_jams)],
+        "startTimeMillis": now_millis - 120000,
+        "endTimeMillis": now_millis,
+    }
+
+
+def generate_feed_cycles(n_alerts=10000, n_jams=5000, n_cycles=10, churn=0.05, changed=0.1, seed=42,
+                         start_millis=None, interval_millis=120000):
+    """
+    Generates consecutive feed snapshots like the live feed: most items stay in the feed from one
+    snapshot to the next, a `churn` fraction is replaced by new items and a `changed` fraction
+    of the jams gets a new speed and delay.
+
+    :param n_cycles: number of snapshots
+    :param start_millis: time of the first snapshot in milliseconds, defaults to now minus n_cycles intervals
+    :param interval_millis: time between the snapshots (the feed updates every 2 minutes)
+    :return: generator of feed dicts (see generate_feed)
+    """
+    rng = random.Random(seed)
+    if start_millis is None:
+        start_millis = int(time.time() * 1000) - n_cycles * interval_millis
+
+    now_millis = start_millis
+    alerts = [generate_alert(rng, now_millis) for _ in range(n_alerts)]
+    jams = [generate_jam(rng, now_millis) for _ in range(n_jams)]
+    for cycle in range(n_cycles):
+        if cycle:
+            now_millis += interval_millis
+            for i in rng.sample(range(n_alerts), int(n_alerts * churn)):
+                alerts[i] = generate_alert(rng, now_millis)
+            for i in rng.sample(range(n_jams), int(n_jams * churn)):
+                jams[i] = generate_jam(rng, now_millis)
+            for i in rng.sample(range(n_jams), int(n_jams * changed)):
+                jams[i] = dict(jams[i], speedKMH=round(rng.uniform(0, 40), 2), delay=rng.randint(-1, 900))
+        yield {
+            "alerts": list(alerts),
+            "jams": list(jams),
+            "startTimeMillis": now_millis - interval_millis,
+            "endTimeMillis": now_millis,
+        }
@@ -0,0 +1,48 @@
+"""
+One-off compaction of the segments table. Before the natural key (jam_id, segment_id, from_node, to_node)
+every ingest cycle inserted the segments of all jams again, this removes the duplicates (the oldest row
+is kept, segments with NULL jam_id/from_node/to_node count as duplicates of each other), creates the unique
+index used by the ingest and reclaims the space.
+
+Usage:
+    python compact_segments.py BRNO [--vacuum-full]
+    python compact_segments.py "ORP MOST"
+"""
+import argparse
+from datetime import datetime
+
+from cons.CONF_REGIONS import REGION_DB_CONFIGS
+from queries.QUERIES import DEDUPLICATE_SEGMENTS_QUERY, CREATE_SEGMENTS_NATURAL_KEY_QUERY
+from queries.queries_inserting_data import connect
+
+def compact_segments(db_config, vacuum_full=False):
+    conn = connect(db_config)
+    try:
+        with conn.cursor() as cursor:
+            # the live ingest can not insert new duplicates between the delete and the index
+            cursor.execute("LOCK TABLE segments IN SHARE ROW EXCLUSIVE MODE;")
+            cursor.execute(DEDUPLICATE_SEGMENTS_QUERY)
+            print(f"[{datetime.now()}] {cursor.rowcount} duplicate segment(s) deleted.")
+            cursor.execute(CREATE_SEGMENTS_NATURAL_KEY_QUERY)
+        conn.commit()
+
+        # VACUUM can not run inside a transaction block
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute("VACUUM (FULL, ANALYZE) segments;" if vacuum_full else "VACUUM (ANALYZE) segments;")
+        print(f"[{datetime.now()}] Segments vacuumed.")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("region", choices=REGION_DB_CONFIGS.keys())
+    parser.add_argument("--vacuum-full", action="store_true",
+                        help="rewrite the table to return the space to the OS (locks the table)")
+    args = parser.parse_args()
+
+    compact_segments(REGION_DB_CONFIGS[args.region], vacuum_full=args.vacuum_full)
@@ -0,0 +1,66 @@
+# Ingest mode for alerts and jams
+#   "row"      - one INSERT ... ON CONFLICT per feed item
+#   "prepared" - same as "row", but with server-side prepared statements
+#   "batch"    - whole feed converted first, then multi-row upserts (execute_values)
+#   "copy"     - COPY into temporary staging tables and one set-based merge
+INGEST_MODE = "copy"
+
+# Waze feed updates every 2 minutes, ingest cycle runs on the same fixed tick
+FEED_INTERVAL_SECONDS = 120
+
+# Persistent region connections, reconnect attempts with exponential backoff
+DB_CONNECT_RETRIES = 5
+DB_CONNECT_BACKOFF_SECONDS = 1.0
+
+# Hourly statistics backend
+#   "python"    - sum_statistics (jams/alerts active during the hour) recalculated by the ingest loop
+#                 (run_statistics_incremental)
+#   "timescale" - the ingest loop does not calculate anything and sum_statistics is not updated; only the
+#                 continuous aggregates jam_hourly_stats/alert_hourly_stats are refreshed by TimescaleDB,
+#                 read through the view published_statistics_cagg. The ingest creates them and their refresh
+#                 policies on startup, with the python backend they do not exist. They count jams/alerts
+#                 published during the hour, which is a different metric than sum_statistics.
+STATISTICS_BACKEND = "python"
+
+# Hourly statistics queries (python backend)
+#   "overlap" - JAM_HOURLY_QUERY/ALERT_HOURLY_QUERY, exact, scan every chunk of jams/alerts
+#   "bounded" - same predicate limited to published_at in [hour - STATISTICS_LOOKBACK, hour end),
+#               jams/alerts active longer than the lookback (e.g. long road closures) are not counted,
+#               use only when no item can stay active that long
+# Used by the per-hour and by the set-based (backfill) calculation alike.
+STATISTICS_QUERY_MODE = "overlap"
+STATISTICS_LOOKBACK = "31 days"
+
+# Change-detection cache, unchanged feed items are only touched instead of upserted.
+# Items missing from the feed for DEACTIVATION_WINDOW_SECONDS are deactivated (DEACTIVATE_OLD_ALERTS_QUERY)
+# and evicted from the cache.
+CHANGE_CACHE_ENABLED = True
+CHANGE_CACHE_MAX_SIZE = 200000
+DEACTIVATION_WINDOW_SECONDS = 300
+
+# Deactivation reads only chunks from the earliest published_at of the active rows on (DeactivationHorizon),
+# all chunks are checked once per DEACTIVATION_FULL_PASS_SECONDS for rows activated outside the ingest loop
+DEACTIVATION_FULL_PASS_SECONDS = 3600
+
+# Feed HTTP client (queries_feed_client.FeedClient), one persistent session with compression and conditional
+# requests. Failed requests (connection errors, timeouts, 429/5xx) are retried with exponential backoff and jitter.
+FEED_CONNECT_TIMEOUT_SECONDS = 5.0
+FEED_READ_TIMEOUT_SECONDS = 30.0
+FEED_RETRIES = 3
+FEED_RETRY_BACKOFF_SECONDS = 1.0
+
+# Archive of the raw feed snapshots (per region and UTC day, one compressed NDJSON file per download),
+# written by a background thread, re-ingested by replay_snapshots.py. None = disabled.
+#   "zstd" - needs the zstandard package
+#   "gzip" - standard library only
+SNAPSHOT_ARCHIVE_DIR = None
+SNAPSHOT_ARCHIVE_COMPRESSION = "zstd"
+
+# Ingest loop metrics (ingest_metrics.py): per-region stage timings, row counts, feed sizes and cycle lag
+#   METRICS_PORT       - Prometheus text endpoint at http://METRICS_HOST:METRICS_PORT/metrics, None = disabled
+#                        (e.g. 9108). The endpoint has no authentication, bind it to an address reachable by
+#                        the Prometheus server only
+#   METRICS_JSONL_PATH - one JSON line per cycle appended to the file, None = disabled
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = None
+METRICS_JSONL_PATH = None
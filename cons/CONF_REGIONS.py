@@ -0,0 +1,31 @@
+from cons.CONF_DB import DB_CONFIG_BRNO, DB_CONFIG_JMK, DB_CONFIG_ORP_MOST
+from cons.FEED_ULRS import FEED_URL_JMK, FEED_URL_ORP_MOST
+
+# Routing mode
+#   "city"    - by the Waze 'city' field ("city" predicates)
+#   "spatial" - by administrative polygons ("area" predicates), jam lines and alert points are matched
+#               against the polygons through an STRtree built at startup
+REGION_ROUTING_MODE = "city"
+
+# Routing of the feed items to region databases.
+# feed url -> ordered list of routes, every item goes to the first route whose predicates all match:
+#   "city"    - list of values of the Waze 'city' field (mode "city")
+#   "area"    - GeoJSON file with the administrative boundary in EPSG:4326 (mode "spatial")
+#   "polygon" - list of (lon, lat) vertices (both modes)
+# A point/line matches a polygon when it intersects it (also for inline "polygon" routes, which matched only the
+# first point of a jam line before the spatial mode). A route without predicates takes everything that is left.
+# The "area" files are not part of the repository, the spatial mode fails at startup when one is missing.
+REGION_ROUTES = {
+    # BRNO A JMK
+    FEED_URL_JMK: [
+        {"region": "BRNO", "db_config": DB_CONFIG_BRNO, "city": ["Brno"], "area": "regions/brno.geojson"},
+        {"region": "JMK", "db_config": DB_CONFIG_JMK},
+    ],
+    # ORP MOST
+    FEED_URL_ORP_MOST: [
+        {"region": "ORP MOST", "db_config": DB_CONFIG_ORP_MOST},
+    ],
+}
+
+# region name -> database, the region names of all tools (ingest, replay, backfill, compaction)
+REGION_DB_CONFIGS = {route["region"]: route["db_config"] for routes in REGION_ROUTES.values() for route in routes}
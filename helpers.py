@@ -1,3 +1,43 @@
+import random
+import struct
+import sys
+from array import array
+from datetime import datetime, timezone
+
+# EWKB geometry type: LineString (2) with the SRID flag
+EWKB_LINESTRING_WITH_SRID = 0x20000002
+
+
 def round_to_hour(dt):
     """Rounds the given datetime to the hour (no minutes, seconds, or microseconds)."""
     return dt.replace(minute=0, second=0, microsecond=0)
+
+
+def backoff_delay(attempt, backoff_seconds, max_backoff_seconds):
+    """
+    Exponential backoff with jitter before the given retry (1 = first retry), in seconds.
+    The delay doubles with every attempt up to max_backoff_seconds and is randomly cut by up to a half,
+    so clients failing at the same time do not retry at the same time.
+    """
+    delay = min(max_backoff_seconds, backoff_seconds * 2 ** (attempt - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def earliest_published(*item_lists):
+    """
+    Earliest pubMillis of the given Waze feed items as an aware UTC datetime, None when there is none.
+    """
+    pub_millis = [item.get("pubMillis") for items in item_lists for item in items]
+    pub_millis = [value for value in pub_millis if type(value) in (int, float)]
+    return datetime.fromtimestamp(min(pub_millis) / 1000.0, timezone.utc) if pub_millis else None
+
+
+def linestring_ewkb(points, srid=4326):
+    """
+    Encodes Waze line points ([{"x": .., "y": ..}, ..]) as little-endian EWKB LineString with SRID,
+    the bytes PostGIS reads with ST_GeomFromEWKB without parsing any text.
+    """
+    coords = array("d", [value for pt in points for value in (pt["x"], pt["y"])])
+    if sys.byteorder != "little":
+        coords.byteswap()
+    return struct.pack("<BIII", 1, EWKB_LINESTRING_WITH_SRID, srid, len(points)) + coords.tobytes()
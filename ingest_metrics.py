@@ -0,0 +1,162 @@
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# seconds, from a fast stage up to several feed intervals
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# name -> (type, help) of the ingest loop metrics
+INGEST_METRICS = {
+    "waze_feed_fetch_seconds": ("histogram", "Feed download, parse and routing time"),
+    "waze_feed_response_seconds": ("histogram", "Time until the feed response headers arrived"),
+    "waze_feed_parse_seconds": ("histogram", "Feed body download, parse and routing time after the headers"),
+    "waze_feed_bytes_received": ("gauge", "Size of the last feed body as received (compressed)"),
+    "waze_feed_bytes_decoded": ("gauge", "Size of the last feed body after decompression"),
+    "waze_feed_fetches_total": ("counter", "Feed downloads by result (ingested, not_modified, unchanged, failed)"),
+    "waze_region_ingest_seconds": ("histogram", "Time of main_loop for one region"),
+    "waze_stage_seconds": ("histogram", "Time of one main_loop stage"),
+    "waze_rows_total": ("counter", "Feed items and segments by table and action"),
+    "waze_ingest_failures_total": ("counter", "Failed main_loop runs"),
+    "waze_connection_setup_seconds": ("gauge", "Time of the last new database connection"),
+    "waze_connections_opened_total": ("counter", "Database connections opened by the region pool"),
+    "waze_cycle_seconds": ("histogram", "Time of one ingest cycle"),
+    "waze_cycle_lag_seconds": ("gauge", "Last cycle time minus the feed interval, positive when the cycle overran"),
+    "waze_cycle_overruns_total": ("counter", "Cycles longer than the feed interval"),
+}
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in items) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """
+    Thread-safe in-process counters, gauges and histograms with labels, rendered in the Prometheus
+    text format. Only what the ingest loop needs, no dependency on prometheus_client.
+    """
+
+    def __init__(self, metrics, buckets=DEFAULT_BUCKETS):
+        self.metrics = metrics
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # name -> labels (sorted tuple of (key, value)) -> value, for histograms [bucket counts, sum, count]
+        self._values = {name: {} for name in metrics}
+
+    @staticmethod
+    def _key(labels):
+        return tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            values = self._values[name]
+            values[key] = values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._values[name][self._key(labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            histogram = self._values[name].get(key)
+            if histogram is None:
+                histogram = self._values[name][key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[0][i] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def render_prometheus(self):
+        lines = []
+        with self._lock:
+            for name, (kind, help_text) in self.metrics.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in sorted(self._values[name].items()):
+                    if kind != "histogram":
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                        continue
+                    bucket_counts, total, count = value
+                    for bound, bucket_count in zip(self.buckets + (math.inf,), bucket_counts + [count]):
+                        lines.append(f"{name}_bucket{_format_labels(labels, ('le', _format_value(bound)))} "
+                                     f"{bucket_count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+# metrics of the ingest loop, shared by all threads
+METRICS = MetricsRegistry(INGEST_METRICS)
+
+
+@contextmanager
+def timed(stages, name):
+    """
+    Adds the time spent in the block to stages[name] (seconds).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages[name] = stages.get(name, 0.0) + time.perf_counter() - start
+
+
+def start_metrics_server(registry, port, host="127.0.0.1"):
+    """
+    Serves the registry in the Prometheus text format at http://host:port/metrics from a background thread.
+    """
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"[{datetime.now()}] Metrics served at http://{host}:{port}/metrics")
+    return server
+
+
+class JsonlMetricsWriter:
+    """
+    Appends one JSON line per ingest cycle to a file, for offline analysis of the cycle timings.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(dict({"time": datetime.now(timezone.utc).isoformat()}, **record), default=str)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
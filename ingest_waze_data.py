@@ -1,74 +1,360 @@
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
 import time
-from cons.CONF_DB import DB_CONFIG_BRNO, DB_CONFIG_JMK, DB_CONFIG_ORP_MOST
-from cons.FEED_ULRS import FEED_URL_JMK, FEED_URL_ORP_MOST
-from queries.QUERIES import INSERT_SEGMENTS_QUERY
-from queries.queries_inserting_data import get_data, connect, insert_jams, insert_alerts, extract_segments_from_jams
-from queries.queries_functions import run_statistics
+from cons.CONF_INGEST import (INGEST_MODE, FEED_INTERVAL_SECONDS, DB_CONNECT_RETRIES, DB_CONNECT_BACKOFF_SECONDS,
+                              STATISTICS_BACKEND, CHANGE_CACHE_ENABLED, CHANGE_CACHE_MAX_SIZE,
+                              DEACTIVATION_WINDOW_SECONDS, FEED_CONNECT_TIMEOUT_SECONDS,
+                              FEED_READ_TIMEOUT_SECONDS, FEED_RETRIES, FEED_RETRY_BACKOFF_SECONDS,
+                              SNAPSHOT_ARCHIVE_DIR, SNAPSHOT_ARCHIVE_COMPRESSION, METRICS_HOST, METRICS_PORT,
+                              METRICS_JSONL_PATH, DEACTIVATION_FULL_PASS_SECONDS)
+from cons.CONF_REGIONS import REGION_ROUTES, REGION_ROUTING_MODE, REGION_DB_CONFIGS
+from helpers import earliest_published
+from ingest_metrics import METRICS, JsonlMetricsWriter, start_metrics_server, timed
+from queries.queries_connection_pool import RegionConnectionPool
+from queries.queries_feed_cache import FeedChangeCache, touch_items
+from queries.queries_feed_client import FeedClient
+from queries.queries_feed_stream import get_region_batches
+from queries.queries_inserting_data import (insert_jams, insert_alerts, insert_alerts_batch,
+                                            insert_jams_batch, insert_segments, extract_segments_from_jams)
+from queries.queries_functions import (run_statistics_incremental, deactive_all_queries, get_active_horizon,
+                                       DeactivationHorizon, create_statistics_caggs,
+                                       create_statistics_watermark_table, create_segments_natural_key)
+from queries.queries_snapshot_archive import SnapshotArchiveWriter
+from queries.queries_staging_data import ingest_feed_copy
+from region_routing import RegionRouter
 
 
-def main_loop(db_config, alerts, jams):
+def ingest_cycle(cursor, alerts, jams, caches=None, horizon=None, mode=INGEST_MODE):
+    """
+    Runs all stages of one region cycle in the transaction of the cursor, the caller commits.
+    Used by main_loop and by the ingest loop harness (benchmarks/bench_ingest_loop.py).
 
-    print(f"[{datetime.now()}] Fetching data...")
-    conn = connect(db_config)
+    :param caches: change-detection caches of the region (dict table -> FeedChangeCache), None without the cache
+    :param horizon: DeactivationHorizon of the region, None to deactivate over all chunks
+    :param mode: ingest mode, see INGEST_MODE
+    :return: tuple (dict stage -> seconds, dict table -> action -> number of rows,
+             function that moves the caches and the horizon on, to be called once the transaction is committed)
+    """
+    stages = {}
+    rows = {"alerts": {}, "jams": {}, "segments": {}}
+    bound = horizon.bound(earliest_published(alerts, jams)) if horizon is not None else None
 
-    try:
+    if caches is not None:
+        # only new or changed items are upserted, unchanged ones are touched in bulk
+        with timed(stages, "change_cache"):
+            for table, cache in caches.items():
+                if not cache.warmed:
+                    cache.warm(cursor)
+            alerts, unchanged_alerts, pending_alerts = caches["alerts"].split(alerts)
+            jams, unchanged_jams, pending_jams = caches["jams"].split(jams)
+            touched_alerts = touch_items(cursor, "alerts", unchanged_alerts)
+            touched_jams = touch_items(cursor, "jams", unchanged_jams)
+        rows["alerts"]["unchanged"] = len(unchanged_alerts)
+        rows["jams"]["unchanged"] = len(unchanged_jams)
+        print(f"[{datetime.now()}] Unchanged items touched: {touched_alerts} alerts, {touched_jams} jams.")
+
+    with timed(stages, "segments_extract"):
+        segments = extract_segments_from_jams(jams)
+
+    if mode == "copy":
+        with timed(stages, "copy"):
+            counts, earliest_inserted, upserted_keys = ingest_feed_copy(cursor, alerts, jams, segments,
+                                                                        deactivate=False)
+        for table, table_counts in counts.items():
+            rows[table].update(table_counts)
+        print(f"[{datetime.now()}] Alerts, jams and segments ingested successfully.")
+    else:
+        with timed(stages, "alerts"):
+            if mode == "batch":
+                upserted_alerts, earliest_alert = insert_alerts_batch(cursor, alerts, deactivate=False)
+            else:
+                upserted_alerts, earliest_alert = insert_alerts(cursor, alerts, prepared=mode == "prepared",
+                                                                deactivate=False)
+        rows["alerts"].update(upserted=len(upserted_alerts), skipped=len(alerts) - len(upserted_alerts))
+        print(f"[{datetime.now()}] Alerts ingested successfully.")
+        with timed(stages, "jams"):
+            if mode == "batch":
+                upserted_jams, earliest_jam = insert_jams_batch(cursor, jams, deactivate=False)
+            else:
+                upserted_jams, earliest_jam = insert_jams(cursor, jams, prepared=mode == "prepared",
+                                                          deactivate=False)
+        rows["jams"].update(upserted=len(upserted_jams), skipped=len(jams) - len(upserted_jams))
+        upserted_keys = {"alerts": upserted_alerts, "jams": upserted_jams}
+        print(f"[{datetime.now()}] Jams ingested successfully.")
+        with timed(stages, "segments"):
+            insert_segments(cursor, segments)
+        rows["segments"]["sent"] = len(segments)
+        # only inserted rows, items that were only touched do not move the recalculation back
+        earliest_inserted = min([published_at for published_at in (earliest_alert, earliest_jam)
+                                 if published_at is not None], default=None)
+
+        print(f"[{datetime.now()}] Segments ingested successfully.")
+
+    # one statement for alerts and jams in every ingest mode
+    with timed(stages, "deactivation"):
+        rows["alerts"]["deactivated"], rows["jams"]["deactivated"] = deactive_all_queries(
+            cursor, min_published_at=bound)
+        active_horizon = get_active_horizon(cursor, bound) if horizon is not None else None
 
-        conn.autocommit = True
+    # only hours changed since the last run, older hours: run_statistics_backfill.py
+    if STATISTICS_BACKEND == "python":
+        with timed(stages, "statistics"):
+            run_statistics_incremental(cursor, earliest_inserted)
 
-        with conn.cursor() as cursor:
-            insert_alerts(cursor, alerts)
-            print(f"[{datetime.now()}] Alerts ingested successfully.")
-            insert_jams(cursor, jams)
-            print(f"[{datetime.now()}] Jams ingested successfully.")
-            segments = extract_segments_from_jams(jams)
-            cursor.executemany(INSERT_SEGMENTS_QUERY, segments)
+    def committed():
+        if horizon is not None:
+            horizon.update(bound, active_horizon)
+        if caches is not None:
+            # failed or rejected items are not remembered, they are upserted again on the next cycle
+            caches["alerts"].remember(pending_alerts, unchanged_alerts + upserted_keys["alerts"])
+            caches["jams"].remember(pending_jams, unchanged_jams + upserted_keys["jams"])
 
-            print(f"[{datetime.now()}] Segments ingested successfully.")
+    return stages, rows, committed
 
-                #TODO: move to separate script with scheduler
-            run_statistics(cursor, "25.04.2024 00:00")
-            # run_statistics(cursor, "28.04.2025 20:00")
-            # run_statistics(cursor)
 
-        conn.commit()
+def main_loop(pool, alerts, jams, caches=None, horizon=None):
+    """
+    Ingests the alerts and jams of one region.
+
+    :param horizon: DeactivationHorizon of the region, None to deactivate over all chunks
+
+    :return: dict with "stages" (stage -> seconds) and "rows" (table -> action -> number of rows),
+             None when the ingest failed
+    """
+    print(f"[{datetime.now()}] Fetching data...")
+    try:
+        # the whole cycle of the region is one transaction, committed at the end or rolled back by the pool
+        with pool.connection() as conn:
+            with conn.cursor() as cursor:
+                stages, rows, committed = ingest_cycle(cursor, alerts, jams, caches, horizon)
+
+            with timed(stages, "commit"):
+                conn.commit()
+            committed()
 
-        print(f"[{datetime.now()}] FULL DATA ingested successfully.")
+            print(f"[{datetime.now()}] FULL DATA ingested successfully.")
+            return {"stages": stages, "rows": rows}
     except Exception as e:
+        # the pool has rolled the transaction back or discarded the broken connection
         print(f"[ERROR] {e}")
-        conn.rollback()
-    finally:
-        conn.close()
+        return None
+
+
+# feed url -> router of the feed items to regions
+FEEDS = {url: RegionRouter(routes, mode=REGION_ROUTING_MODE) for url, routes in REGION_ROUTES.items()}
+
+# feed url -> name used in logs and metrics (the url contains the partner token)
+FEED_NAMES = {url: "+".join(router.regions) for url, router in FEEDS.items()}
+
+# region name -> connection pool, kept open across ingest cycles
+REGION_POOLS = {
+    region: RegionConnectionPool(region, db_config, connect_retries=DB_CONNECT_RETRIES,
+                                 backoff_seconds=DB_CONNECT_BACKOFF_SECONDS)
+    for region, db_config in REGION_DB_CONFIGS.items()
+}
+
+# region name -> change-detection caches of alerts and jams, kept across ingest cycles
+REGION_CACHES = {
+    region: {table: FeedChangeCache(table, max_size=CHANGE_CACHE_MAX_SIZE, ttl_seconds=DEACTIVATION_WINDOW_SECONDS)
+             for table in ("alerts", "jams")}
+    for region in REGION_DB_CONFIGS
+} if CHANGE_CACHE_ENABLED else {}
+
+# region name -> published_at bound of the deactivation, kept across ingest cycles
+REGION_HORIZONS = {region: DeactivationHorizon(DEACTIVATION_FULL_PASS_SECONDS) for region in REGION_DB_CONFIGS}
+
+# one HTTP session for all feeds, kept open across ingest cycles
+FEED_CLIENT = FeedClient(connect_timeout=FEED_CONNECT_TIMEOUT_SECONDS, read_timeout=FEED_READ_TIMEOUT_SECONDS,
+                         retries=FEED_RETRIES, backoff_seconds=FEED_RETRY_BACKOFF_SECONDS)
+
+# background writer of the raw snapshots, None when the archive is disabled
+SNAPSHOT_ARCHIVE = (SnapshotArchiveWriter(SNAPSHOT_ARCHIVE_DIR, compression=SNAPSHOT_ARCHIVE_COMPRESSION)
+                    if SNAPSHOT_ARCHIVE_DIR else None)
+
+# cycle records appended to METRICS_JSONL_PATH, None when disabled
+METRICS_WRITER = JsonlMetricsWriter(METRICS_JSONL_PATH) if METRICS_JSONL_PATH else None
+
+
+def prepare_databases():
+    """
+    Creates the database objects of the chosen configuration that init.sql does not create, once on startup.
+    init.sql runs only on a fresh volume, so objects added to it later are created here in existing databases
+    as well, every step is idempotent. The continuous aggregates and their refresh jobs exist only with
+    the "timescale" statistics backend.
+    """
+    for region, pool in REGION_POOLS.items():
+        with pool.connection() as conn:
+            with conn.cursor() as cursor:
+                create_statistics_watermark_table(cursor)
+                create_segments_natural_key(cursor)
+                if STATISTICS_BACKEND == "timescale":
+                    create_statistics_caggs(cursor)
+            conn.commit()
+        print(f"[{datetime.now()}] Database of {region} prepared.")
+
+
+def fetch_feed(url):
+    """
+    Downloads the feed and splits it to regions.
+
+    :return: tuple (dict region name -> (alerts, jams) or None when the feed is unchanged, FeedPayload,
+             time of the download, seconds)
+    """
+    fetched_at = datetime.now(timezone.utc)
+    start = time.perf_counter()
+    router = FEEDS[url]
+    batches, payload = get_region_batches(FEED_CLIENT, url, router, router.regions)
+    return batches, payload, fetched_at, time.perf_counter() - start
+
+
+def ingest_region(region, alerts, jams):
+    """
+    Ingests one region and records its metrics.
+
+    :return: tuple (seconds, main_loop result or None when the ingest failed)
+    """
+    print(f"[{datetime.now()}] INGESTING DATA FOR {region}")
+    pool = REGION_POOLS[region]
+    connects_before = pool.connects
+    start = time.perf_counter()
+    result = main_loop(pool, alerts, jams, REGION_CACHES.get(region), REGION_HORIZONS[region])
+    elapsed = time.perf_counter() - start
+    print(f"[{datetime.now()}] {region}: {len(alerts)} alerts, {len(jams)} jams ingested in {elapsed:.2f} s "
+          f"(connection setup {pool.last_connect_seconds:.3f} s, {pool.connects} connection(s) opened so far)")
+
+    METRICS.observe("waze_region_ingest_seconds", elapsed, region=region)
+    METRICS.set("waze_connection_setup_seconds", pool.last_connect_seconds, region=region)
+    METRICS.inc("waze_connections_opened_total", pool.connects - connects_before, region=region)
+    if result is None:
+        METRICS.inc("waze_ingest_failures_total", region=region)
+    else:
+        for stage, seconds in result["stages"].items():
+            METRICS.observe("waze_stage_seconds", seconds, region=region, stage=stage)
+        for table, counts in result["rows"].items():
+            for action, count in counts.items():
+                METRICS.inc("waze_rows_total", count, region=region, table=table, action=action)
+    return elapsed, result
+
+
+def record_fetch(url, batches, payload, fetch_time):
+    """
+    Records the feed metrics of one download.
+
+    :return: dict for the JSONL metrics record
+    """
+    feed = FEED_NAMES[url]
+    record = {"fetch_seconds": fetch_time}
+    METRICS.observe("waze_feed_fetch_seconds", fetch_time, feed=feed)
+    if payload.not_modified:
+        result = "not_modified"
+    else:
+        result = "unchanged" if batches is None else "ingested"
+        response_time = payload.response.elapsed.total_seconds()
+        METRICS.observe("waze_feed_response_seconds", response_time, feed=feed)
+        METRICS.observe("waze_feed_parse_seconds", fetch_time - response_time, feed=feed)
+        METRICS.set("waze_feed_bytes_received", payload.bytes_received, feed=feed)
+        METRICS.set("waze_feed_bytes_decoded", payload.bytes_read, feed=feed)
+        record.update(response_seconds=response_time, bytes_received=payload.bytes_received,
+                      bytes_decoded=payload.bytes_read)
+    METRICS.inc("waze_feed_fetches_total", feed=feed, result=result)
+    record["result"] = result
+    return record
+
+
+def run_cycle(executor):
+    """
+    Runs one ingest cycle. Both feeds are fetched concurrently and every region is written
+    to its database as soon as its feed is downloaded, regions run in parallel.
+    A feed that is not modified (304) or identical to the last ingested payload is not ingested at all,
+    the payload is committed to the feed client only when all regions of the feed were ingested.
+
+    :param executor: ThreadPoolExecutor shared by the fetches and the region writes
+    :return: dict region name -> seconds spent in main_loop
+    """
+    cycle_start = time.perf_counter()
+    fetches = {executor.submit(fetch_feed, url): url for url in FEEDS}
+    writes = {}
+    payloads = {}
+    feed_records = {}
+
+    for fetch in as_completed(fetches):
+        url = fetches[fetch]
+        try:
+            batches, payload, fetched_at, fetch_time = fetch.result()
+        except Exception as e:
+            print(f"[ERROR] Fetching {url} failed: {e}")
+            METRICS.inc("waze_feed_fetches_total", feed=FEED_NAMES[url], result="failed")
+            feed_records[FEED_NAMES[url]] = {"result": "failed"}
+            continue
+        feed_records[FEED_NAMES[url]] = record_fetch(url, batches, payload, fetch_time)
+        if batches is None:
+            reason = "not modified" if payload.not_modified else "identical to the last payload"
+            print(f"[{datetime.now()}] Fetched {url} in {fetch_time:.2f} s, {reason}, skipping ingest")
+            continue
+        print(f"[{datetime.now()}] Fetched {url} in {fetch_time:.2f} s "
+              f"({payload.bytes_received} bytes received, {payload.bytes_read} bytes decoded)")
+
+        payloads[url] = payload
+        for region, (alerts, jams) in batches.items():
+            if SNAPSHOT_ARCHIVE is not None:
+                SNAPSHOT_ARCHIVE.submit(region, fetched_at, alerts, jams)
+            writes[executor.submit(ingest_region, region, alerts, jams)] = url, region
+
+    timings = {}
+    region_records = {}
+    failed_urls = set()
+    for write in as_completed(writes):
+        url, region = writes[write]
+        try:
+            timings[region], result = write.result()
+        except Exception as e:
+            print(f"[ERROR] Ingest for {region} failed: {e}")
+            result = None
+        if result is None:
+            failed_urls.add(url)
+            region_records[region] = {"failed": True}
+        else:
+            region_records[region] = dict(result, seconds=timings[region])
+
+    for url, payload in payloads.items():
+        if url not in failed_urls:
+            FEED_CLIENT.commit(url, payload)
+
+    cycle_time = time.perf_counter() - cycle_start
+    lag = cycle_time - FEED_INTERVAL_SECONDS
+    METRICS.observe("waze_cycle_seconds", cycle_time)
+    METRICS.set("waze_cycle_lag_seconds", lag)
+    if lag > 0:
+        METRICS.inc("waze_cycle_overruns_total")
+    if METRICS_WRITER is not None:
+        METRICS_WRITER.write({"cycle_seconds": cycle_time, "lag_seconds": lag, "feeds": feed_records,
+                              "regions": region_records})
+
+    summary = ", ".join(f"{region} {seconds:.2f} s" for region, seconds in sorted(timings.items(),
+                                                                                 key=lambda item: -item[1]))
+    print(f"[{datetime.now()}] Cycle finished in {cycle_time:.2f} s ({summary})")
+    print(f"=" * 75)
+    return timings
 
 
 if __name__ == "__main__":
-    while True:
-        # BRNO A JMK
-        data = get_data(FEED_URL_JMK)
-        alerts_brno_jmk = data.get("alerts", [])
-        jams_brno_jmk = data.get("jams", [])
-
-        # for Brno, filter only for city Brno
-        alerts_brno = [alert for alert in alerts_brno_jmk if alert.get('city') == 'Brno']
-        jams_brno = [jam for jam in jams_brno_jmk if jam.get('city') == 'Brno']
-        print(f"[{datetime.now()}] INGESTING DATA FOR BRNO")
-        main_loop(DB_CONFIG_BRNO, alerts_brno, jams_brno)
-        print(f"="*75)
-
-        # for JMK - everything but city Brno
-        alerts_jmk = [alert for alert in alerts_brno_jmk if alert.get('city') != 'Brno']
-        jams_jmk = [jam for jam in jams_brno_jmk if jam.get('city') != 'Brno']
-        print(f"[{datetime.now()}] INGESTING DATA FOR JMK")
-        main_loop(DB_CONFIG_JMK, alerts_jmk, jams_jmk)
-        print(f"="*75)
-
-        # ORP MOST
-        data = get_data(FEED_URL_ORP_MOST)
-        alerts_orp_most = data.get("alerts", [])
-        jams_orp_most = data.get("jams", [])
-        print(f"[{datetime.now()}] INGESTING DATA FOR ORP MOST")
-        main_loop(DB_CONFIG_ORP_MOST, alerts_orp_most, jams_orp_most)
-        print(f"="*75)
-
-        # data_jams updates every 2 minutes -> sleep for 2 minutes
-        time.sleep(120)
+    if METRICS_PORT is not None:
+        start_metrics_server(METRICS, METRICS_PORT, host=METRICS_HOST)
+
+    prepare_databases()
+
+    # one thread per feed and one per region database
+    with ThreadPoolExecutor(max_workers=len(FEEDS) + len(REGION_DB_CONFIGS)) as executor:
+        # data_jams updates every 2 minutes -> run the cycle on a fixed 2 minute tick,
+        # the time spent by the cycle is subtracted from the sleep
+        next_tick = time.monotonic()
+        while True:
+            run_cycle(executor)
+
+            next_tick += FEED_INTERVAL_SECONDS
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                print(f"[{datetime.now()}] Cycle overran the feed interval by {-delay:.2f} s")
+                next_tick = time.monotonic()
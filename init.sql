@@ -64,6 +64,13 @@ CREATE TABLE IF NOT EXISTS segments (
     is_forward BOOLEAN
 );
 
+-- Natural key of a segment, jam_id/from_node/to_node can be NULL and PostgreSQL 14 has no NULLS NOT DISTINCT,
+-- so NULLs are coalesced to -1 (ids in the feed are positive) and a NULL key does not insert duplicates
+CREATE UNIQUE INDEX IF NOT EXISTS idx_segments_natural_key_coalesced ON segments (
+    (COALESCE(jam_id, -1)), (COALESCE(segment_id, -1)), (COALESCE(from_node, -1)), (COALESCE(to_node, -1)));
+-- segment-to-jam joins
+CREATE INDEX IF NOT EXISTS idx_segments_jam_id ON segments (jam_id);
+
 
 CREATE TABLE IF NOT EXISTS sum_statistics (
     stat_time TIMESTAMPTZ PRIMARY KEY,  -- Rounded to the hour
@@ -75,6 +82,16 @@ CREATE TABLE IF NOT EXISTS sum_statistics (
     avg_jam_level FLOAT
 );
 
+-- Hourly statistics as TimescaleDB continuous aggregates (STATISTICS_BACKEND = "timescale" in cons/CONF_INGEST.py)
+-- are opt-in, the ingest creates them on startup when that backend is chosen (CREATE_STATISTICS_CAGG_QUERIES
+-- in queries/QUERIES.py)
+
+-- Watermark of the incremental statistics (time of the last statistics run)
+CREATE TABLE IF NOT EXISTS statistics_watermark (
+    name TEXT PRIMARY KEY,
+    watermark TIMESTAMPTZ NOT NULL
+);
+
 CREATE TABLE IF NOT EXISTS nehody (
     p1 BIGINT PRIMARY KEY,
     p36 TEXT,
@@ -133,5 +150,10 @@ SELECT create_hypertable('nehody', 'p2a', if_not_exists => TRUE);
 
 CREATE INDEX IF NOT EXISTS idx_jams_jam_line ON jams USING GIST(jam_line);
 CREATE INDEX IF NOT EXISTS idx_alerts_location ON alerts USING GIST(location);
+CREATE INDEX IF NOT EXISTS idx_jams_published_last_updated ON jams (published_at, last_updated);
+CREATE INDEX IF NOT EXISTS idx_alerts_published_last_updated ON alerts (published_at, last_updated);
+-- Only active rows, deactivation (DEACTIVATE_OLD_ALERTS_QUERY) reads just the active set of every chunk
+CREATE INDEX IF NOT EXISTS idx_jams_active_last_updated ON jams (last_updated) WHERE active = TRUE;
+CREATE INDEX IF NOT EXISTS idx_alerts_active_last_updated ON alerts (last_updated) WHERE active = TRUE;
 CREATE INDEX IF NOT EXISTS idx_accidents_geom ON nehody USING GIST(geom);
 CREATE INDEX IF NOT EXISTS idx_accidents_geog ON nehody USING GIST(geog);
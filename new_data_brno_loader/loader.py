@@ -1,11 +1,23 @@
-import binascii
-import json
+import os
+import sys
+import time
+import ijson
+import numpy as np
 import psycopg2
+import psycopg2.errors
 import pandas as pd
 from datetime import datetime
 from pyproj import Transformer
 from psycopg2.extras import execute_values
-from shapely import LineString, wkb, MultiLineString
+
+# Spúšťa sa ako skript (python new_data_brno_loader/loader.py), dátové súbory ležia vedľa loader.py
+# a zdieľaný balík queries v koreni repozitára, nezávisle od pracovného adresára
+LOADER_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(LOADER_DIR))
+
+from queries.queries_staging_data import copy_records
+from queries.queries_validation import (RejectLog, validate_columns, point_checks, wkb_points_xy, wkb_hex_types,
+                                        datetime_seconds, WKB_LINESTRING, WKB_MULTILINESTRING)
 
 # --- DB CONFIG ---
 conn = psycopg2.connect(
@@ -20,227 +32,312 @@ conn = psycopg2.connect(
 transformer = Transformer.from_crs("EPSG:5514", "EPSG:4326", always_xy=True)
 
 
-def safe_int(val):
-    if val is None:
-        return -1
-    try:
-        return int(val)
-    except:
-        return -1
-
+def int_column(df, name):
+    """
+    Whole column as a list of integers, -1 where the value (or the column) is missing or not a number.
+    """
+    if name not in df:
+        return [-1] * len(df)
+    return pd.to_numeric(df[name], errors='coerce').fillna(-1).astype(np.int64).tolist()
+
+
+def float_column(df, name):
+    """
+    Whole column as a list of floats, -1.0 where the value (or the column) is missing or not a number.
+    """
+    if name not in df:
+        return [-1.0] * len(df)
+    return pd.to_numeric(df[name], errors='coerce').fillna(-1.0).tolist()
+
+
+def column_values(df, name, default=None):
+    """
+    Values of a column as Python objects for psycopg2, None instead of NaN/NaT.
+    The default is used for every row when the file has no such column.
+    """
+    if name not in df:
+        return [default] * len(df)
+    values = df[name]
+    return values.astype(object).where(values.notna(), None).tolist()
+
+
+NEHODY_COLUMNS = [
+    "p1", "p36", "p37", "p2a", "p2b", "p6", "p7", "p8", "p9", "p10", "p11", "p12",
+    "p13a", "p13b", "p13c", "p14", "p15", "p16", "p17", "p18", "p19", "p20", "p21",
+    "p22", "p23", "p24", "p27", "p28", "p34", "p35", "p39", "p44", "p45a", "p47",
+    "p48a", "p49", "p50a", "p50b", "p51", "p52", "p53", "p55a", "p57", "p58",
+    "p5a", "p8a", "p11a"
+]
+
+NEHODY_INT_FIELDS = {
+    "p1", "p2b", "p6", "p7", "p8", "p9", "p10", "p11", "p12", "p13a", "p13b", "p13c",
+    "p14", "p15", "p16", "p17", "p18", "p19", "p20", "p21", "p22", "p23", "p24",
+    "p27", "p28", "p34", "p35", "p44", "p45a", "p48a", "p49", "p50a", "p50b",
+    "p51", "p52", "p53", "p55a", "p57", "p58", "p5a", "p8a", "p11a"
+}
+
+# Features converted and copied to the DB at once, memory stays flat regardless of the file size
+NEHODY_CHUNK_SIZE = 10000
+
+# EPSG:5514 -> 4326 of the accident points (geog)
+#   "client" - pyproj, one array call per chunk, lon/lat sent as floats
+#   "server" - PostGIS derives geog from geom with ST_Transform
+NEHODY_TRANSFORM = "client"
+
+# Chunks are copied to a staging table with plain float coordinates, the points are built by PostGIS
+# (ST_MakePoint) while moving the chunk to nehody, no WKT is formatted or parsed
+NEHODY_STAGE_QUERY = f"""
+    CREATE TEMP TABLE IF NOT EXISTS nehody_stage AS
+        SELECT {", ".join(NEHODY_COLUMNS)}, x, y, x AS lon, y AS lat FROM nehody WITH NO DATA;
+    TRUNCATE nehody_stage;
+"""
+
+# lon/lat are NULL with the "server" transform, geog is then transformed from geom
+NEHODY_FROM_STAGE_QUERY = f"""
+    INSERT INTO nehody ({", ".join(NEHODY_COLUMNS)}, x, y, geom, geog)
+    SELECT {", ".join(NEHODY_COLUMNS)}, x, y, ST_SetSRID(ST_MakePoint(x, y), 5514),
+        COALESCE(ST_SetSRID(ST_MakePoint(lon, lat), 4326),
+                 ST_Transform(ST_SetSRID(ST_MakePoint(x, y), 5514), 4326))::geography
+    FROM nehody_stage;
+    TRUNCATE nehody_stage;
+"""
+
+
+def nehoda_to_record(feature):
+    """
+    Record of one accident for nehody_stage: properties, x and y.
+    """
+    props = feature['properties']
+    coords = feature['geometry']['coordinates']
+    x, y = float(coords[0]), float(coords[1])
+
+    row = []
+    for key in NEHODY_COLUMNS:
+        val = props.get(key)
+        if val is None:
+            row.append(-1 if key in NEHODY_INT_FIELDS else None)
+        else:
+            if key in NEHODY_INT_FIELDS:
+                try:
+                    row.append(int(float(val)))
+                except:
+                    row.append(-1)
+            else:
+                row.append(val)
 
-def safe_float(val):
-    if val is None:
-        return -1.0
+    # Dátum p2a
     try:
-        return float(val)
+        p2a_date = datetime.strptime(props.get("p2a", ""), "%d/%m/%Y").date()
     except:
-        return -1.0
-
-
-def load_nehody():
-    # --- Načítanie GeoJSON ---
-    with open('./nehody.geojson', 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
-    columns = [
-        "p1", "p36", "p37", "p2a", "p2b", "p6", "p7", "p8", "p9", "p10", "p11", "p12",
-        "p13a", "p13b", "p13c", "p14", "p15", "p16", "p17", "p18", "p19", "p20", "p21",
-        "p22", "p23", "p24", "p27", "p28", "p34", "p35", "p39", "p44", "p45a", "p47",
-        "p48a", "p49", "p50a", "p50b", "p51", "p52", "p53", "p55a", "p57", "p58",
-        "p5a", "p8a", "p11a"
-    ]
-
-    int_fields = {
-        "p1", "p2b", "p6", "p7", "p8", "p9", "p10", "p11", "p12", "p13a", "p13b", "p13c",
-        "p14", "p15", "p16", "p17", "p18", "p19", "p20", "p21", "p22", "p23", "p24",
-        "p27", "p28", "p34", "p35", "p44", "p45a", "p48a", "p49", "p50a", "p50b",
-        "p51", "p52", "p53", "p55a", "p57", "p58", "p5a", "p8a", "p11a"
-    }
-
-    nehody_records = []
-
-    for feature in data['features']:
-        props = feature['properties']
-        coords = feature['geometry']['coordinates']
-        x, y = coords[0], coords[1]
-        lon4326, lat4326 = transformer.transform(x, y)
-
-        row = []
-        for key in columns:
-            val = props.get(key)
-            if val is None:
-                row.append(-1 if key in int_fields else None)
-            else:
-                if key in int_fields:
-                    try:
-                        row.append(int(float(val)))
-                    except:
-                        row.append(-1)
-                else:
-                    row.append(val)
-
-        # Dátum p2a
+        p2a_date = None
+    row[3] = p2a_date  # prepísať správnu hodnotu dátumu
+
+    # Súradnice
+    row.extend([x, y])
+
+    return tuple(row)
+
+
+def with_lon_lat(records):
+    """
+    Adds lon/lat (EPSG:4326) to the records of one chunk, all points are transformed with one pyproj call.
+    """
+    xs = np.fromiter((record[-2] for record in records), dtype=float, count=len(records))
+    ys = np.fromiter((record[-1] for record in records), dtype=float, count=len(records))
+    lons, lats = transformer.transform(xs, ys)
+    return [record + (lon, lat) for record, lon, lat in zip(records, lons.tolist(), lats.tolist())]
+
+
+def iter_nehody_chunks(path, chunk_size=NEHODY_CHUNK_SIZE):
+    """
+    Parses the GeoJSON as a stream (ijson), only one chunk of features is in memory at a time.
+    Numbers come as int/Decimal like in json.load (ints and exact decimals), coordinates are converted to float.
+
+    :return: generator of lists of records (see nehoda_to_record)
+    """
+    with open(path, 'rb') as f:
+        chunk = []
+        for feature in ijson.items(f, 'features.item'):
+            chunk.append(nehoda_to_record(feature))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def load_nehody(path=os.path.join(LOADER_DIR, 'nehody.geojson'), chunk_size=NEHODY_CHUNK_SIZE,
+                transform=NEHODY_TRANSFORM):
+    start = time.perf_counter()
+    loaded = 0
+
+    cur.execute(NEHODY_STAGE_QUERY)
+
+    # --- Streamed import, every chunk is sent with COPY ---
+    for chunk in iter_nehody_chunks(path, chunk_size):
+        if transform == "server":
+            copy_records(cur, "nehody_stage", NEHODY_COLUMNS + ["x", "y"], chunk)
+        else:
+            copy_records(cur, "nehody_stage", NEHODY_COLUMNS + ["x", "y", "lon", "lat"], with_lon_lat(chunk))
+        cur.execute(NEHODY_FROM_STAGE_QUERY)
+        loaded += len(chunk)
+        elapsed = time.perf_counter() - start
+        print(f"Nehody: {loaded} records copied ({loaded / elapsed:.0f} rows/s)")
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ Nehody: {loaded} records loaded in {elapsed:.1f} s ({loaded / elapsed if elapsed else 0:.0f} rows/s).")
+
+
+JAMS_INSERT_QUERY = """
+    INSERT INTO jams (
+        id, country, city, jam_level, speed_kmh, jam_length, turn_type,
+        uuid, street, end_node, start_node, speed, road_type, delay,
+        blocking_alert_uuid, published_at, last_updated, active, jam_line
+    ) VALUES %s
+    ON CONFLICT (uuid, published_at) DO UPDATE SET
+        last_updated = EXCLUDED.last_updated,
+        active = EXCLUDED.active;
+"""
+
+# jam_line is sent as the hex WKB of the export, PostGIS parses it
+JAMS_LINESTRING_TEMPLATE = """
+    (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
+     ST_SetSRID(%s::geometry, 4326))
+"""
+
+# MultiLineStrings are joined into one line from all their points in order
+JAMS_MULTILINESTRING_TEMPLATE = """
+    (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
+     ST_SetSRID(ST_MakeLine(ARRAY(SELECT dp.geom FROM ST_DumpPoints(%s::geometry) AS dp ORDER BY dp.path)), 4326))
+"""
+
+
+def insert_pages(query, records, template, page_size=500):
+    """
+    Inserts the records page by page, each page under a SAVEPOINT. A page PostGIS can not parse
+    (e.g. a corrupt WKB body behind a valid header) is rolled back and inserted row by row,
+    so one bad geometry does not abort the whole import. Other columns are validated before,
+    any other database error is raised.
+    :return: tuple (numpy boolean mask of the inserted records, dict record index -> PostGIS error)
+    """
+    inserted = np.ones(len(records), dtype=bool)
+    errors = {}
+    for start in range(0, len(records), page_size):
+        page = records[start:start + page_size]
+        cur.execute("SAVEPOINT insert_page")
         try:
-            p2a_date = datetime.strptime(props.get("p2a", ""), "%d/%m/%Y").date()
-        except:
-            p2a_date = None
-        row[3] = p2a_date  # prepísať správnu hodnotu dátumu
-
-        # Súradnice a geom/geog
-        row.extend([
-            x,
-            y,
-            f'SRID=5514;POINT({x} {y})',
-            f'SRID=4326;POINT({lon4326} {lat4326})'
-        ])
-
-        nehody_records.append(tuple(row))
-
-    # --- Execute batch insert ---
-    execute_values(cur, """
-        INSERT INTO nehody (
-            p1, p36, p37, p2a, p2b, p6, p7, p8, p9, p10, p11, p12,
-            p13a, p13b, p13c, p14, p15, p16, p17, p18, p19, p20, p21,
-            p22, p23, p24, p27, p28, p34, p35, p39, p44, p45a, p47,
-            p48a, p49, p50a, p50b, p51, p52, p53, p55a, p57, p58,
-            p5a, p8a, p11a, x, y,
-            geom, geog
-        ) VALUES %s
-    """, nehody_records, template="""
-        (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-         %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-         %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-         %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-         %s, %s, %s, %s, %s,
-         ST_GeomFromText(%s, 5514),
-         ST_GeogFromText(%s)
-        )
-    """, page_size=500)
-
-    print(f"✅ Nehody: {len(nehody_records)} records loaded.")
+            execute_values(cur, query, page, template=template, page_size=page_size)
+        except psycopg2.errors.InternalError_:
+            # PostGIS reports geometry parse errors as internal errors (XX000)
+            cur.execute("ROLLBACK TO SAVEPOINT insert_page")
+            for offset, record in enumerate(page):
+                cur.execute("SAVEPOINT insert_row")
+                try:
+                    execute_values(cur, query, [record], template=template)
+                except psycopg2.errors.InternalError_ as e:
+                    cur.execute("ROLLBACK TO SAVEPOINT insert_row")
+                    inserted[start + offset] = False
+                    errors[start + offset] = e.diag.message_primary
+                cur.execute("RELEASE SAVEPOINT insert_row")
+        cur.execute("RELEASE SAVEPOINT insert_page")
+    return inserted, errors
 
 
 def load_jams():
     # Načítanie CSV so správnym parsovaním dátumov a potlačením DtypeWarning
-    jams_df = pd.read_csv('./jams_updated2.csv', parse_dates=['published_at', 'last_updated'], low_memory=False)
-    jams_df = jams_df.where(pd.notnull(jams_df), None)
-
-    jams_records = []
-
-    for _, row in jams_df.iterrows():
-        try:
-            # Geometria z WKB HEX na LineString alebo MultiLineString
-            wkb_hex = row['jam_line']
-            wkb_bytes = binascii.unhexlify(wkb_hex)
-            geom = wkb.loads(wkb_bytes)
-
-            if isinstance(geom, MultiLineString):
-                # Spojenie všetkých čiar do jednej
-                coords = []
-                for line in geom.geoms:
-                    coords.extend(line.coords)
-                linestring = LineString(coords)
-            elif isinstance(geom, LineString):
-                linestring = geom
-            else:
-                raise ValueError(f"Unsupported geometry type: {geom.geom_type}")
-
-            record = (
-                safe_int(row['id']),
-                row.get('country'),
-                row.get('city'),
-                safe_int(row['jam_level']),
-                safe_int(row['speed_kmh']),
-                safe_int(row['jam_length']),
-                row.get('turn_type'),
-                row.get('uuid'),
-                row.get('street'),
-                row.get('end_node'),
-                row.get('start_node'),
-                safe_float(row['speed']),
-                safe_int(row['road_type']),
-                safe_int(row['delay']),
-                row.get('blocking_alert_uuid'),
-                row['published_at'],
-                row['last_updated'],
-                row.get('active', True),
-                linestring.wkt
-            )
-            jams_records.append(record)
-        except Exception as e:
-            print(f"❌ JAMS: Error while processing row: {e}")
-
-    # Deduplicate jams_records by (uuid, published_at)
-    unique_records = {}
-    for rec in jams_records:
-        key = (rec[7], rec[15])
-        unique_records[key] = rec
-    jams_records = list(unique_records.values())
-
-    # Batch insert into DB
-    execute_values(cur, """
-        INSERT INTO jams (
-            id, country, city, jam_level, speed_kmh, jam_length, turn_type,
-            uuid, street, end_node, start_node, speed, road_type, delay,
-            blocking_alert_uuid, published_at, last_updated, active, jam_line
-        ) VALUES %s
-        ON CONFLICT (uuid, published_at) DO UPDATE SET
-            last_updated = EXCLUDED.last_updated,
-            active = EXCLUDED.active;
-    """, jams_records, template="""
-        (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-         ST_SetSRID(ST_GeomFromText(%s), 4326))
-    """, page_size=500)
-
-    print(f"✅ Jams: {len(jams_records)} records loaded.")
+    jams_df = pd.read_csv(os.path.join(LOADER_DIR, 'jams_updated2.csv'), parse_dates=['published_at', 'last_updated'],
+                          low_memory=False)
+
+    # Typ geometrie z hlavičky WKB HEX, LineString alebo MultiLineString, geometria sa v Pythone neparsuje
+    wkb_types = wkb_hex_types(jams_df['jam_line'])
+    is_multi = wkb_types == WKB_MULTILINESTRING
+    uuids = pd.to_numeric(jams_df['uuid'], errors='coerce').to_numpy(dtype=float)
+    rejects = RejectLog("jam")
+    valid = validate_columns({
+        "jam_line": is_multi | (wkb_types == WKB_LINESTRING),
+        "uuid": np.isfinite(uuids) & (uuids == np.round(uuids)),
+        "published_at": np.isfinite(datetime_seconds(jams_df['published_at'])),
+    }, rejects, describe=lambda i: f"uuid={jams_df['uuid'].iat[i]}")
+
+    # Deduplicate jams by (uuid, published_at), the last occurrence wins
+    jams_df = jams_df.assign(is_multi=is_multi)[valid].drop_duplicates(['uuid', 'published_at'], keep='last')
+
+    jams_records = list(zip(
+        int_column(jams_df, 'id'),
+        column_values(jams_df, 'country'),
+        column_values(jams_df, 'city'),
+        int_column(jams_df, 'jam_level'),
+        int_column(jams_df, 'speed_kmh'),
+        int_column(jams_df, 'jam_length'),
+        column_values(jams_df, 'turn_type'),
+        column_values(jams_df, 'uuid'),
+        column_values(jams_df, 'street'),
+        column_values(jams_df, 'end_node'),
+        column_values(jams_df, 'start_node'),
+        float_column(jams_df, 'speed'),
+        int_column(jams_df, 'road_type'),
+        int_column(jams_df, 'delay'),
+        column_values(jams_df, 'blocking_alert_uuid'),
+        column_values(jams_df, 'published_at'),
+        column_values(jams_df, 'last_updated'),
+        column_values(jams_df, 'active', True),
+        jams_df['jam_line'].tolist(),
+    ))
+
+    # Batch insert into DB, only the MultiLineStrings are flattened by PostGIS,
+    # rows PostGIS cannot parse are skipped and reported like the invalid ones
+    multi = jams_df['is_multi'].tolist()
+    loaded = multi_loaded = 0
+    for is_multi_batch, template in ((False, JAMS_LINESTRING_TEMPLATE), (True, JAMS_MULTILINESTRING_TEMPLATE)):
+        batch = [record for record, m in zip(jams_records, multi) if m == is_multi_batch]
+        inserted, errors = insert_pages(JAMS_INSERT_QUERY, batch, template)
+        rejects.add({"jam_line body": inserted}, inserted, describe=lambda i: f"uuid={batch[i][7]}: {errors[i]}")
+        loaded += int(np.count_nonzero(inserted))
+        if is_multi_batch:
+            multi_loaded = int(np.count_nonzero(inserted))
+    rejects.report()
+
+    print(f"✅ Jams: {loaded} records loaded ({multi_loaded} MultiLineStrings joined).")
 
 
 def load_alerts():
-    alerts_df = pd.read_csv('alerts.csv', parse_dates=['published_at', 'last_updated'], low_memory=False)
-    alerts_df = alerts_df.where(pd.notnull(alerts_df), None)
-
-    alerts_records = []
-
-    for _, row in alerts_df.iterrows():
-        try:
-            # Parsovanie location z WKB HEX na bod
-            wkb_hex = row['location']
-            wkb_bytes = binascii.unhexlify(wkb_hex)
-            point = wkb.loads(wkb_bytes)
-            x, y = point.x, point.y
-
-            record = (
-                row['uuid'],
-                row.get('country'),
-                row.get('city'),
-                safe_int(row.get('report_rating')),
-                (row.get('report_by_municipality_user', 'f') in ['t', 'true', True]),
-                safe_int(row.get('confidence')),
-                safe_int(row.get('reliability')),
-                row.get('type'),
-                row.get('subtype'),
-                row.get('street'),
-                safe_int(row.get('road_type')),
-                safe_int(row.get('magvar')),
-                row.get('report_description'),
-                x,
-                y,
-                row['published_at'],
-                row['last_updated'],
-                row.get('active', True)
-            )
-            alerts_records.append(record)
-        except Exception as e:
-            print(f"❌ ALERTS: Error while processing alert with uuid: {row.get('uuid')}: {e}")
-
-    # Deduplicate alerts_records by (uuid, published_at)
-    unique_alerts = {}
-    for rec in alerts_records:
-        key = (rec[0], rec[15])  # uuid, published_at
-        unique_alerts[key] = rec  # posledný výskyt vyhrá
-
-    alerts_records = list(unique_alerts.values())
+    alerts_df = pd.read_csv(os.path.join(LOADER_DIR, 'alerts.csv'), parse_dates=['published_at', 'last_updated'],
+                            low_memory=False)
+
+    # Locations parsed and validated for the whole file at once, rejected rows are counted, not printed
+    xs, ys = wkb_points_xy(alerts_df['location'])
+    checks = point_checks(xs, ys, datetime_seconds(alerts_df['published_at']))
+    checks["uuid"] = alerts_df['uuid'].notna().to_numpy()
+    rejects = RejectLog("alert")
+    valid = validate_columns(checks, rejects, describe=lambda i: f"uuid={alerts_df['uuid'].iat[i]}")
+    rejects.report()
+
+    # Deduplicate alerts by (uuid, published_at), the last occurrence wins
+    alerts_df = alerts_df.assign(x=xs, y=ys)[valid].drop_duplicates(['uuid', 'published_at'], keep='last')
+
+    municipality_user = (alerts_df['report_by_municipality_user'].isin(['t', 'true', True])
+                         if 'report_by_municipality_user' in alerts_df else pd.Series(False, index=alerts_df.index))
+
+    alerts_records = list(zip(
+        column_values(alerts_df, 'uuid'),
+        column_values(alerts_df, 'country'),
+        column_values(alerts_df, 'city'),
+        int_column(alerts_df, 'report_rating'),
+        municipality_user.tolist(),
+        int_column(alerts_df, 'confidence'),
+        int_column(alerts_df, 'reliability'),
+        column_values(alerts_df, 'type'),
+        column_values(alerts_df, 'subtype'),
+        column_values(alerts_df, 'street'),
+        int_column(alerts_df, 'road_type'),
+        int_column(alerts_df, 'magvar'),
+        column_values(alerts_df, 'report_description'),
+        alerts_df['x'].tolist(),
+        alerts_df['y'].tolist(),
+        column_values(alerts_df, 'published_at'),
+        column_values(alerts_df, 'last_updated'),
+        column_values(alerts_df, 'active', True),
+    ))
 
     execute_values(cur, """
         INSERT INTO alerts (
@@ -5,6 +5,42 @@ DEACTIVATE_OLD_ALERTS_QUERY = """
             AND last_updated < NOW() - INTERVAL '5 minutes';
             """
 
+# Deactivation of alerts and jams in one statement, uses the partial indexes on active rows.
+# as_of is the time of the snapshot (NULL = now), set by the replay of archived snapshots.
+# min_published_at (NULL = no bound) is the earliest published_at of any active row (DeactivationHorizon),
+# TimescaleDB then excludes the older chunks already when planning.
+DEACTIVATE_OLD_ITEMS_QUERY = """
+            WITH deactivated_alerts AS (
+                UPDATE alerts
+                SET active = FALSE
+                WHERE active = TRUE
+                AND last_updated < COALESCE(%(as_of)s::timestamptz, NOW()) - INTERVAL '5 minutes'
+                AND published_at >= COALESCE(%(min_published_at)s::timestamptz, '-infinity')
+                RETURNING 1
+            ), deactivated_jams AS (
+                UPDATE jams
+                SET active = FALSE
+                WHERE active = TRUE
+                AND last_updated < COALESCE(%(as_of)s::timestamptz, NOW()) - INTERVAL '5 minutes'
+                AND published_at >= COALESCE(%(min_published_at)s::timestamptz, '-infinity')
+                RETURNING 1
+            )
+            SELECT
+                (SELECT COUNT(*) FROM deactivated_alerts),
+                (SELECT COUNT(*) FROM deactivated_jams);
+            """
+
+# Earliest published_at of the active alerts/jams, run after DEACTIVATE_OLD_ITEMS_QUERY
+ACTIVE_HORIZON_QUERY = """
+            SELECT LEAST(
+                (SELECT MIN(published_at) FROM alerts
+                 WHERE active = TRUE
+                 AND published_at >= COALESCE(%(min_published_at)s::timestamptz, '-infinity')),
+                (SELECT MIN(published_at) FROM jams
+                 WHERE active = TRUE
+                 AND published_at >= COALESCE(%(min_published_at)s::timestamptz, '-infinity')));
+            """
+
 SUM_STATISTICS_INSERT_QUERY = """
         INSERT INTO sum_statistics (
             stat_time, total_active_jams, total_active_alerts,
@@ -43,7 +79,424 @@ ALERT_HOURLY_QUERY = """
                 (published_at <= %s AND last_updated >= %s)
         """
 
+# Same "active during the hour" predicate, bounded on published_at so that TimescaleDB can exclude
+# chunks and use idx_jams_published_last_updated/idx_alerts_published_last_updated.
+# published_at < end follows from the predicate (published_at <= last_updated), the lower bound assumes
+# that no jam/alert stays active longer than the lookback.
+JAM_HOURLY_BOUNDED_QUERY = """
+            SELECT
+                COUNT(*) AS total_jams,
+                AVG(speed_kmh)::FLOAT AS avg_speed_kmh,
+                AVG(jam_length)::FLOAT AS avg_jam_length,
+                AVG(delay)::FLOAT AS avg_delay,
+                AVG(jam_level)::FLOAT AS avg_jam_level
+            FROM jams
+            WHERE published_at < %(end)s
+                AND published_at >= %(start)s - %(lookback)s::INTERVAL
+                AND ((published_at >= %(start)s AND last_updated < %(end)s) OR
+                    (published_at <= %(start)s AND last_updated >= %(start)s))
+        """
+
+ALERT_HOURLY_BOUNDED_QUERY = """
+            SELECT COUNT(*) AS total_alerts
+            FROM alerts
+            WHERE published_at < %(end)s
+                AND published_at >= %(start)s - %(lookback)s::INTERVAL
+                AND ((published_at >= %(start)s AND last_updated < %(end)s) OR
+                    (published_at <= %(start)s AND last_updated >= %(start)s))
+        """
+
 INSERT_SEGMENTS_QUERY = """
     INSERT INTO segments (jam_id, from_node, to_node, segment_id, is_forward)
-    VALUES (%s, %s, %s, %s, %s);
-    """
\ No newline at end of file
+    VALUES %s
+    ON CONFLICT ((COALESCE(jam_id, -1)), (COALESCE(segment_id, -1)),
+                 (COALESCE(from_node, -1)), (COALESCE(to_node, -1))) DO NOTHING;
+    """
+
+# Batched upserts (used with psycopg2.extras.execute_values), every row is returned with
+# (xmax = 0) = inserted by the statement (not updated) and its published_at
+ALERTS_BATCH_UPSERT_QUERY = """
+    INSERT INTO alerts (uuid, country, city, report_rating, report_by_municipality_user,
+        confidence, reliability, type, subtype, street, road_type, magvar,
+        report_description, location, published_at, last_updated, active)
+    VALUES %s
+    ON CONFLICT (uuid, published_at) DO UPDATE SET
+        last_updated = now(),
+        active = TRUE
+    RETURNING (xmax = 0) AS inserted, published_at;
+    """
+
+ALERTS_BATCH_UPSERT_TEMPLATE = """
+    (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
+     ST_SetSRID(ST_MakePoint(%s, %s), 4326), to_timestamp(%s / 1000.0), now(), TRUE)
+    """
+
+JAMS_BATCH_UPSERT_QUERY = """
+    INSERT INTO jams (uuid, country, jam_level, city, speed_kmh, jam_length, turn_type,
+        end_node, start_node, speed, road_type, delay, street, published_at, jam_line,
+        blocking_alert_uuid, last_updated, active)
+    VALUES %s
+    ON CONFLICT (uuid, published_at) DO UPDATE SET
+        last_updated = now(),
+        active = TRUE
+    RETURNING (xmax = 0) AS inserted, published_at;
+    """
+
+JAMS_BATCH_UPSERT_TEMPLATE = """
+    (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
+     to_timestamp(%s / 1000.0), ST_GeomFromEWKB(%s),
+     %s, now(), TRUE)
+    """
+
+
+# Staging tables for the COPY based loader, the merge casts the values to the target column types
+CREATE_STAGING_TABLES_QUERY = """
+    CREATE TEMP TABLE IF NOT EXISTS alerts_stage (
+        uuid UUID,
+        country TEXT,
+        city TEXT,
+        report_rating NUMERIC,
+        report_by_municipality_user BOOLEAN,
+        confidence NUMERIC,
+        reliability NUMERIC,
+        type TEXT,
+        subtype TEXT,
+        street TEXT,
+        road_type NUMERIC,
+        magvar NUMERIC,
+        report_description TEXT,
+        x FLOAT,
+        y FLOAT,
+        pub_millis NUMERIC
+    );
+
+    CREATE TEMP TABLE IF NOT EXISTS jams_stage (
+        uuid NUMERIC,
+        country TEXT,
+        jam_level NUMERIC,
+        city TEXT,
+        speed_kmh NUMERIC,
+        jam_length NUMERIC,
+        turn_type TEXT,
+        end_node TEXT,
+        start_node TEXT,
+        speed FLOAT,
+        road_type NUMERIC,
+        delay NUMERIC,
+        street TEXT,
+        pub_millis NUMERIC,
+        jam_line BYTEA,
+        blocking_alert_uuid UUID
+    );
+
+    CREATE TEMP TABLE IF NOT EXISTS segments_stage (
+        jam_id BIGINT,
+        from_node BIGINT,
+        to_node BIGINT,
+        segment_id BIGINT,
+        is_forward BOOLEAN
+    );
+
+    TRUNCATE alerts_stage, jams_stage, segments_stage;
+    """
+
+# as_of as in DEACTIVATE_OLD_ITEMS_QUERY, last_updated never moves back when an older snapshot is replayed.
+# xmax = 0 only for rows inserted by the statement, the counts are (inserted, updated) alerts and jams, new segments,
+# followed by the earliest published_at of the inserted alerts/jams (older statistics hours they change)
+MERGE_STAGING_TABLES_QUERY = """
+    WITH upserted_alerts AS (
+        INSERT INTO alerts (uuid, country, city, report_rating, report_by_municipality_user,
+            confidence, reliability, type, subtype, street, road_type, magvar,
+            report_description, location, published_at, last_updated, active)
+        SELECT uuid, country, city, report_rating, report_by_municipality_user,
+            confidence, reliability, type, subtype, street, road_type, magvar,
+            report_description, ST_SetSRID(ST_MakePoint(x, y), 4326), to_timestamp(pub_millis / 1000.0),
+            COALESCE(%(as_of)s::timestamptz, now()), TRUE
+        FROM alerts_stage
+        ON CONFLICT (uuid, published_at) DO UPDATE SET
+            last_updated = GREATEST(alerts.last_updated, EXCLUDED.last_updated),
+            active = TRUE
+        RETURNING (xmax = 0) AS inserted, published_at
+    ), upserted_jams AS (
+        INSERT INTO jams (uuid, country, jam_level, city, speed_kmh, jam_length, turn_type,
+            end_node, start_node, speed, road_type, delay, street, published_at, jam_line,
+            blocking_alert_uuid, last_updated, active)
+        SELECT uuid, country, jam_level, city, speed_kmh, jam_length, turn_type,
+            end_node, start_node, speed, road_type, delay, street, to_timestamp(pub_millis / 1000.0),
+            ST_GeomFromEWKB(jam_line), blocking_alert_uuid, COALESCE(%(as_of)s::timestamptz, now()), TRUE
+        FROM jams_stage
+        ON CONFLICT (uuid, published_at) DO UPDATE SET
+            last_updated = GREATEST(jams.last_updated, EXCLUDED.last_updated),
+            active = TRUE
+        RETURNING (xmax = 0) AS inserted, published_at
+    ), inserted_segments AS (
+        INSERT INTO segments (jam_id, from_node, to_node, segment_id, is_forward)
+        SELECT jam_id, from_node, to_node, segment_id, is_forward
+        FROM segments_stage
+        ON CONFLICT ((COALESCE(jam_id, -1)), (COALESCE(segment_id, -1)),
+                     (COALESCE(from_node, -1)), (COALESCE(to_node, -1))) DO NOTHING
+        RETURNING 1
+    )
+    SELECT
+        (SELECT COUNT(*) FILTER (WHERE inserted) FROM upserted_alerts),
+        (SELECT COUNT(*) FILTER (WHERE NOT inserted) FROM upserted_alerts),
+        (SELECT COUNT(*) FILTER (WHERE inserted) FROM upserted_jams),
+        (SELECT COUNT(*) FILTER (WHERE NOT inserted) FROM upserted_jams),
+        (SELECT COUNT(*) FROM inserted_segments),
+        LEAST((SELECT MIN(published_at) FILTER (WHERE inserted) FROM upserted_alerts),
+              (SELECT MIN(published_at) FILTER (WHERE inserted) FROM upserted_jams));
+    """
+
+
+# Server-side prepared statements for the per-row upserts, prepared once per pooled connection,
+# RETURNING as in the batched upserts
+PREPARE_UPSERTS_QUERY = """
+    PREPARE upsert_alert (UUID, TEXT, TEXT, INTEGER, BOOLEAN, INTEGER, INTEGER, TEXT, TEXT, TEXT, INTEGER,
+                          INTEGER, TEXT, FLOAT, FLOAT, NUMERIC) AS
+        INSERT INTO alerts (uuid, country, city, report_rating, report_by_municipality_user,
+            confidence, reliability, type, subtype, street, road_type, magvar,
+            report_description, location, published_at, last_updated, active)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13,
+            ST_SetSRID(ST_MakePoint($14, $15), 4326), to_timestamp($16 / 1000.0), now(), TRUE)
+        ON CONFLICT (uuid, published_at) DO UPDATE SET
+            last_updated = now(),
+            active = TRUE
+        RETURNING (xmax = 0) AS inserted, published_at;
+
+    PREPARE upsert_jam (INTEGER, TEXT, INTEGER, TEXT, INTEGER, INTEGER, TEXT, TEXT, TEXT, FLOAT, INTEGER,
+                        INTEGER, TEXT, NUMERIC, BYTEA, UUID) AS
+        INSERT INTO jams (uuid, country, jam_level, city, speed_kmh, jam_length, turn_type,
+            end_node, start_node, speed, road_type, delay, street, published_at, jam_line,
+            blocking_alert_uuid, last_updated, active)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13,
+            to_timestamp($14 / 1000.0), ST_GeomFromEWKB($15),
+            $16, now(), TRUE)
+        ON CONFLICT (uuid, published_at) DO UPDATE SET
+            last_updated = now(),
+            active = TRUE
+        RETURNING (xmax = 0) AS inserted, published_at;
+    """
+
+EXECUTE_UPSERT_ALERT_QUERY = """
+    EXECUTE upsert_alert (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
+    """
+
+EXECUTE_UPSERT_JAM_QUERY = """
+    EXECUTE upsert_jam (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
+    """
+
+HEALTH_CHECK_QUERY = "SELECT 1;"
+
+
+# Watermark of the incremental statistics, the table is created on startup in databases initialized
+# before it was added to init.sql
+CREATE_STATISTICS_WATERMARK_TABLE_QUERY = """
+    CREATE TABLE IF NOT EXISTS statistics_watermark (
+        name TEXT PRIMARY KEY,
+        watermark TIMESTAMPTZ NOT NULL
+    );
+    """
+
+GET_STATISTICS_WATERMARK_QUERY = """
+    SELECT watermark FROM statistics_watermark WHERE name = %s;
+    """
+
+SET_STATISTICS_WATERMARK_QUERY = """
+    INSERT INTO statistics_watermark (name, watermark)
+    VALUES (%s, %s)
+    ON CONFLICT (name) DO UPDATE SET watermark = EXCLUDED.watermark;
+    """
+
+DB_NOW_QUERY = "SELECT now();"
+
+
+# Statistics for a range of hours in one statement. Every jam/alert is expanded only to the hours
+# around its lifetime and the candidate hours are filtered with the same predicate as
+# JAM_HOURLY_QUERY/ALERT_HOURLY_QUERY, so the results match the per-hour calculation.
+# The prefilter keeps rows with last_updated < published_at, the per-hour predicate counts them
+# in the hours up to published_at.
+# lookback is NULL for the exact calculation (STATISTICS_QUERY_MODE "overlap"), otherwise the same
+# published_at bound per hour as JAM_HOURLY_BOUNDED_QUERY/ALERT_HOURLY_BOUNDED_QUERY.
+SUM_STATISTICS_RANGE_SELECT = """
+    WITH hours AS (
+        SELECT generate_series(%(start)s::timestamptz, %(end)s::timestamptz - INTERVAL '1 hour',
+                               INTERVAL '1 hour') AS stat_time
+    ), jam_hours AS (
+        SELECT h.stat_time, j.speed_kmh, j.jam_length, j.delay, j.jam_level
+        FROM jams j
+        CROSS JOIN LATERAL generate_series(
+            GREATEST(date_trunc('hour', LEAST(j.published_at, j.last_updated - INTERVAL '1 hour')),
+                     %(start)s::timestamptz),
+            LEAST(GREATEST(j.published_at, j.last_updated), %(end)s::timestamptz - INTERVAL '1 hour'),
+            INTERVAL '1 hour') AS h(stat_time)
+        WHERE j.published_at < %(end)s
+            AND (j.last_updated >= %(start)s OR j.published_at >= %(start)s)
+            AND (%(lookback)s::INTERVAL IS NULL
+                OR j.published_at >= %(start)s::timestamptz - %(lookback)s::INTERVAL)
+            AND ((j.published_at >= h.stat_time AND j.last_updated < h.stat_time + INTERVAL '1 hour')
+                OR (j.published_at <= h.stat_time AND j.last_updated >= h.stat_time))
+            AND (%(lookback)s::INTERVAL IS NULL OR j.published_at >= h.stat_time - %(lookback)s::INTERVAL)
+    ), jam_stats AS (
+        SELECT stat_time,
+            COUNT(*) AS total_jams,
+            AVG(speed_kmh)::FLOAT AS avg_speed_kmh,
+            AVG(jam_length)::FLOAT AS avg_jam_length,
+            AVG(delay)::FLOAT AS avg_delay,
+            AVG(jam_level)::FLOAT AS avg_jam_level
+        FROM jam_hours
+        GROUP BY stat_time
+    ), alert_stats AS (
+        SELECT h.stat_time, COUNT(*) AS total_alerts
+        FROM alerts a
+        CROSS JOIN LATERAL generate_series(
+            GREATEST(date_trunc('hour', LEAST(a.published_at, a.last_updated - INTERVAL '1 hour')),
+                     %(start)s::timestamptz),
+            LEAST(GREATEST(a.published_at, a.last_updated), %(end)s::timestamptz - INTERVAL '1 hour'),
+            INTERVAL '1 hour') AS h(stat_time)
+        WHERE a.published_at < %(end)s
+            AND (a.last_updated >= %(start)s OR a.published_at >= %(start)s)
+            AND (%(lookback)s::INTERVAL IS NULL
+                OR a.published_at >= %(start)s::timestamptz - %(lookback)s::INTERVAL)
+            AND ((a.published_at >= h.stat_time AND a.last_updated < h.stat_time + INTERVAL '1 hour')
+                OR (a.published_at <= h.stat_time AND a.last_updated >= h.stat_time))
+            AND (%(lookback)s::INTERVAL IS NULL OR a.published_at >= h.stat_time - %(lookback)s::INTERVAL)
+        GROUP BY h.stat_time
+    )
+    SELECT
+        hours.stat_time,
+        COALESCE(jam_stats.total_jams, 0),
+        COALESCE(alert_stats.total_alerts, 0),
+        COALESCE(jam_stats.avg_speed_kmh, 0),
+        COALESCE(jam_stats.avg_jam_length, 0),
+        COALESCE(jam_stats.avg_delay, 0),
+        COALESCE(jam_stats.avg_jam_level, 0)
+    FROM hours
+    LEFT JOIN jam_stats ON jam_stats.stat_time = hours.stat_time
+    LEFT JOIN alert_stats ON alert_stats.stat_time = hours.stat_time
+    ORDER BY hours.stat_time
+    """
+
+SUM_STATISTICS_RANGE_INSERT_QUERY = """
+    INSERT INTO sum_statistics (
+        stat_time, total_active_jams, total_active_alerts,
+        avg_speed_kmh, avg_jam_length, avg_delay, avg_jam_level
+    )
+    """ + SUM_STATISTICS_RANGE_SELECT + """
+    ON CONFLICT (stat_time) DO UPDATE
+    SET
+        total_active_jams = EXCLUDED.total_active_jams,
+        total_active_alerts = EXCLUDED.total_active_alerts,
+        avg_speed_kmh = EXCLUDED.avg_speed_kmh,
+        avg_jam_length = EXCLUDED.avg_jam_length,
+        avg_delay = EXCLUDED.avg_delay,
+        avg_jam_level = EXCLUDED.avg_jam_level;
+    """
+
+
+# Whether the natural key of segments exists (databases initialized before it was added to init.sql)
+SEGMENTS_NATURAL_KEY_EXISTS_QUERY = "SELECT to_regclass('idx_segments_natural_key_coalesced') IS NOT NULL;"
+
+# Removes duplicate segments (keeps the oldest row) before the natural key is created,
+# PARTITION BY groups NULLs together like the coalesced key
+DEDUPLICATE_SEGMENTS_QUERY = """
+    DELETE FROM segments
+    WHERE id IN (
+        SELECT id
+        FROM (
+            SELECT id, ROW_NUMBER() OVER (PARTITION BY jam_id, segment_id, from_node, to_node ORDER BY id) AS row_number
+            FROM segments
+        ) numbered
+        WHERE numbered.row_number > 1
+    );
+    """
+
+# jam_id, from_node and to_node can be NULL, PostgreSQL 14 has no NULLS NOT DISTINCT, so NULLs are
+# coalesced to -1 in the key (ids in the feed are positive), same as in init.sql
+CREATE_SEGMENTS_NATURAL_KEY_QUERY = """
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_segments_natural_key_coalesced ON segments (
+        (COALESCE(jam_id, -1)), (COALESCE(segment_id, -1)), (COALESCE(from_node, -1)), (COALESCE(to_node, -1)));
+    CREATE INDEX IF NOT EXISTS idx_segments_jam_id ON segments (jam_id);
+    """
+
+
+# Keys of active rows, used to warm the change-detection cache on startup
+ACTIVE_KEYS_QUERY = """
+    SELECT uuid::TEXT, ROUND(EXTRACT(EPOCH FROM published_at) * 1000)::BIGINT
+    FROM {table}
+    WHERE active = TRUE;
+    """
+
+# Bulk "still in the feed" update of unchanged alerts/jams, the published_at lower bound lets
+# TimescaleDB skip older chunks
+TOUCH_ITEMS_QUERY = """
+    UPDATE {table} AS target
+    SET last_updated = now(),
+        active = TRUE
+    FROM unnest(%(uuids)s::{uuid_type}[], %(pub_millis)s::NUMERIC[]) AS touched(uuid, pub_millis)
+    WHERE target.uuid = touched.uuid
+        AND target.published_at = to_timestamp(touched.pub_millis / 1000.0)
+        AND target.published_at >= to_timestamp(%(min_pub_millis)s / 1000.0);
+    """
+
+
+# TimescaleDB continuous aggregates of the "timescale" statistics backend, created by the ingest on startup
+# only when STATISTICS_BACKEND = "timescale" (create_statistics_caggs), so other deployments get no refresh jobs.
+# Continuous aggregates can only bucket by the hypertable time column, so the hours are hours of published_at:
+# they count jams/alerts PUBLISHED during the hour. That is a different metric than sum_statistics
+# (jams/alerts ACTIVE during the hour), published_statistics_cagg does not replace sum_statistics.
+CREATE_STATISTICS_CAGG_QUERIES = (
+    """
+    CREATE MATERIALIZED VIEW IF NOT EXISTS jam_hourly_stats
+    WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+    SELECT
+        time_bucket(INTERVAL '1 hour', published_at) AS stat_time,
+        COUNT(*) AS total_jams,
+        AVG(speed_kmh)::FLOAT AS avg_speed_kmh,
+        AVG(jam_length)::FLOAT AS avg_jam_length,
+        AVG(delay)::FLOAT AS avg_delay,
+        AVG(jam_level)::FLOAT AS avg_jam_level
+    FROM jams
+    GROUP BY time_bucket(INTERVAL '1 hour', published_at)
+    WITH NO DATA;
+    """,
+    """
+    CREATE MATERIALIZED VIEW IF NOT EXISTS alert_hourly_stats
+    WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+    SELECT
+        time_bucket(INTERVAL '1 hour', published_at) AS stat_time,
+        COUNT(*) AS total_alerts
+    FROM alerts
+    GROUP BY time_bucket(INTERVAL '1 hour', published_at)
+    WITH NO DATA;
+    """,
+    # rows can arrive with a published_at in the past (old pubMillis, replayed snapshots), refresh the last days
+    # every 5 minutes
+    """
+    SELECT add_continuous_aggregate_policy('jam_hourly_stats',
+        start_offset => INTERVAL '3 days',
+        end_offset => INTERVAL '1 hour',
+        schedule_interval => INTERVAL '5 minutes',
+        if_not_exists => TRUE);
+    """,
+    """
+    SELECT add_continuous_aggregate_policy('alert_hourly_stats',
+        start_offset => INTERVAL '3 days',
+        end_offset => INTERVAL '1 hour',
+        schedule_interval => INTERVAL '5 minutes',
+        if_not_exists => TRUE);
+    """,
+    # hourly counts and averages of the jams/alerts published during the hour
+    """
+    CREATE OR REPLACE VIEW published_statistics_cagg AS
+    SELECT
+        COALESCE(j.stat_time, a.stat_time) AS stat_time,
+        COALESCE(j.total_jams, 0)::INTEGER AS total_published_jams,
+        COALESCE(a.total_alerts, 0)::INTEGER AS total_published_alerts,
+        COALESCE(j.avg_speed_kmh, 0) AS avg_speed_kmh,
+        COALESCE(j.avg_jam_length, 0) AS avg_jam_length,
+        COALESCE(j.avg_delay, 0) AS avg_delay,
+        COALESCE(j.avg_jam_level, 0) AS avg_jam_level
+    FROM jam_hourly_stats j
+    FULL OUTER JOIN alert_hourly_stats a ON a.stat_time = j.stat_time;
+    """,
+)
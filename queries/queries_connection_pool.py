@@ -0,0 +1,158 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import psycopg2
+
+from helpers import backoff_delay
+from queries.QUERIES import PREPARE_UPSERTS_QUERY, HEALTH_CHECK_QUERY
+from queries.queries_inserting_data import connect
+
+
+class RegionConnectionPool:
+    """
+    Long-lived pool of connections to one region database, shared across ingest cycles.
+
+    Connections are opened with queries_inserting_data.connect, checked with a cheap query
+    before every checkout and reopened with exponential backoff when the database is gone.
+    Every new connection prepares the upsert_alert/upsert_jam statements, so the per-row
+    ingest can run them with EXECUTE. Connections are handed out with autocommit off, the caller
+    commits its transaction, connection() rolls it back when the block fails.
+    """
+
+    def __init__(self, name, db_config, max_size=2, connect_retries=5, backoff_seconds=1.0,
+                 max_backoff_seconds=30.0):
+        self.name = name
+        self.db_config = db_config
+        self.max_size = max_size
+        self.connect_retries = connect_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+
+        self._idle = queue.LifoQueue()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        # connection setup metrics
+        self.connects = 0
+        self.connect_seconds_total = 0.0
+        self.last_connect_seconds = 0.0
+
+    def _open(self):
+        """
+        Opens a new connection, retries with exponential backoff and jitter.
+        """
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            conn = None
+            try:
+                conn = connect(self.db_config)
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(PREPARE_UPSERTS_QUERY)
+                # the caller runs its work in one transaction and commits or rolls it back
+                conn.autocommit = False
+            except psycopg2.Error as e:
+                # a connection opened before the failed PREPARE is not kept
+                if conn is not None:
+                    conn.close()
+                attempt += 1
+                if attempt > self.connect_retries:
+                    raise
+                delay = backoff_delay(attempt, self.backoff_seconds, self.max_backoff_seconds)
+                print(f"[{datetime.now()}] {self.name}: connection failed ({e}), retrying in {delay:.1f} s")
+                time.sleep(delay)
+                continue
+
+            elapsed = time.perf_counter() - start
+            self.connects += 1
+            self.connect_seconds_total += elapsed
+            self.last_connect_seconds = elapsed
+            print(f"[{datetime.now()}] {self.name}: connection opened in {elapsed:.3f} s")
+            return conn
+
+    @staticmethod
+    def _is_healthy(conn):
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(HEALTH_CHECK_QUERY)
+            # the check does not leave a transaction open on the idle connection
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._lock:
+            self._size -= 1
+
+    def getconn(self):
+        """
+        Returns a healthy connection, an idle one when possible.
+        """
+        self.last_connect_seconds = 0.0
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if self._is_healthy(conn):
+                return conn
+            print(f"[{datetime.now()}] {self.name}: dropping broken connection")
+            self._discard(conn)
+
+        with self._lock:
+            if self._size >= self.max_size:
+                raise RuntimeError(f"Connection pool for {self.name} exhausted ({self.max_size} connections)")
+            self._size += 1
+        try:
+            return self._open()
+        except Exception:
+            with self._lock:
+                self._size -= 1
+            raise
+
+    def putconn(self, conn, broken=False):
+        """
+        Returns the connection to the pool, broken connections are closed.
+        """
+        if broken or conn.closed:
+            self._discard(conn)
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        except Exception:
+            # the failed transaction is rolled back before the connection is reused
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+            raise
+        finally:
+            self.putconn(conn, broken)
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(conn)
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+
+from queries.QUERIES import ACTIVE_KEYS_QUERY, TOUCH_ITEMS_QUERY
+
+# uuid column type of the tables
+UUID_TYPES = {
+    "alerts": "UUID",
+    "jams": "INTEGER",
+}
+
+
+def item_key(item):
+    """
+    (uuid, pubMillis) of an alert or jam from the Waze feed, same key as (uuid, published_at) in the DB.
+    """
+    return str(item.get("uuid")), item.get("pubMillis")
+
+
+# Fields of the feed items the ingest writes for a row that already exists. The upserts only set last_updated
+# and active ON CONFLICT, the same as touch_items, but the segments of a jam are inserted with it, so a jam
+# with new segments has to go through the upsert again. Other fields (e.g. speed, delay, reliability) are
+# stored only when the row is inserted, a change of them alone does not need an upsert.
+HASHED_FIELDS = {
+    "alerts": (),
+    "jams": ("id", "segments"),
+}
+
+
+def item_hash(item, fields):
+    """
+    Hash of the given fields of an alert or jam from the Waze feed.
+    """
+    content = [item.get(field) for field in fields]
+    return hashlib.blake2b(json.dumps(content, sort_keys=True, default=str).encode("utf-8"), digest_size=16).digest()
+
+
+class FeedChangeCache:
+    """
+    In-process cache of the alerts or jams of one region keyed by (uuid, pubMillis), with the hash
+    of the HASHED_FIELDS and the last time the item was in the feed.
+
+    Only new or changed items have to be upserted, unchanged ones are just touched (last_updated, active)
+    with one bulk statement. Items missing from the feed for longer than the deactivation window are evicted,
+    the database deactivates them in the meantime, and the cache never grows over max_size entries.
+    """
+
+    def __init__(self, table, max_size=200000, ttl_seconds=300):
+        self.table = table
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.fields = HASHED_FIELDS[table]
+        self.warmed = False
+        # key -> (content hash or None when loaded from the DB, last seen)
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def warm(self, cursor):
+        """
+        Loads keys of the active rows from the database. Their content hash is unknown, they are
+        taken as unchanged the first time they are seen (the upsert would only touch them anyway).
+        """
+        cursor.execute(ACTIVE_KEYS_QUERY.format(table=self.table))
+        now = time.monotonic()
+        for uuid, pub_millis in cursor.fetchall():
+            self._entries[(uuid, int(pub_millis))] = (None, now)
+        self.warmed = True
+        self._evict(now)
+        print(f"Change cache for '{self.table}' warmed with {len(self._entries)} active item(s).")
+
+    def split(self, items):
+        """
+        Splits feed items to the ones that have to be upserted and the unchanged ones.
+        The cache is not modified, call remember() once the cycle is stored.
+
+        :param items: alerts or jams from the Waze feed
+        :return: tuple (changed items, unchanged keys, pending cache entries)
+        """
+        changed = []
+        unchanged_keys = []
+        pending = {}
+        for item in items:
+            key = item_key(item)
+            if not isinstance(key[1], (int, float)):
+                # invalid pubMillis, left to the validation of the ingest
+                changed.append(item)
+                continue
+            content_hash = item_hash(item, self.fields)
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] in (None, content_hash):
+                unchanged_keys.append(key)
+            else:
+                changed.append(item)
+            pending[key] = content_hash
+        return changed, unchanged_keys, pending
+
+    def remember(self, pending, stored_keys):
+        """
+        Stores the pending entries of split() once the cycle is committed. Only the keys that were
+        stored (upserted or touched) are remembered, an item whose upsert failed or that was rejected
+        stays unknown and is upserted again on the next cycle.
+
+        :param pending: pending cache entries from split()
+        :param stored_keys: keys of the upserted and the touched items
+        """
+        now = time.monotonic()
+        for key in stored_keys:
+            content_hash = pending.get(key)
+            if content_hash is None:
+                continue
+            self._entries[key] = (content_hash, now)
+            self._entries.move_to_end(key)
+        self._evict(now)
+
+    def _evict(self, now):
+        # entries are ordered by the last time they were seen
+        while self._entries:
+            key, (_, last_seen) = next(iter(self._entries.items()))
+            if now - last_seen <= self.ttl_seconds and len(self._entries) <= self.max_size:
+                break
+            del self._entries[key]
+
+
+def touch_items(cursor, table, keys):
+    """
+    Sets last_updated = now() and active = TRUE for the unchanged items in one statement.
+
+    :param cursor: psycopg2 cursor
+    :param table: "alerts" or "jams"
+    :param keys: list of (uuid, pubMillis) from FeedChangeCache.split
+    :return: number of touched rows
+    """
+    if not keys:
+        return 0
+    cursor.execute(TOUCH_ITEMS_QUERY.format(table=table, uuid_type=UUID_TYPES[table]), {
+        "uuids": [uuid for uuid, _ in keys],
+        "pub_millis": [pub_millis for _, pub_millis in keys],
+        "min_pub_millis": min(pub_millis for _, pub_millis in keys),
+    })
+    return cursor.rowcount
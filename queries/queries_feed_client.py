@@ -0,0 +1,191 @@
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import requests
+# "gzip,deflate", plus "br" when brotli is installed (urllib3 then decodes it as well)
+from urllib3.util.request import ACCEPT_ENCODING
+
+from helpers import backoff_delay
+
+# responses worth another attempt, anything else (e.g. 401, 404) fails right away
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class FeedPayload:
+    """
+    Response body of one feed download, file-like (read) so it can be parsed as a stream.
+    The body is hashed while it is read, the digest is the content-hash of the whole payload.
+    """
+
+    def __init__(self, response=None):
+        self.response = response
+        self.not_modified = response is None
+        self.etag = response.headers.get("ETag") if response is not None else None
+        self.last_modified = response.headers.get("Last-Modified") if response is not None else None
+        self.bytes_read = 0
+        self._hash = hashlib.blake2b(digest_size=16)
+        self._digest = None
+
+    def read(self, size=-1):
+        data = self.response.raw.read(size if size is not None and size >= 0 else None)
+        self._hash.update(data)
+        self.bytes_read += len(data)
+        return data
+
+    @property
+    def bytes_received(self):
+        """
+        Bytes of the body as they came over the network (compressed).
+        """
+        return self.response.raw.tell() if self.response is not None else 0
+
+    def digest(self):
+        """
+        Content-hash of the payload, the rest of the body is read first (the parser may stop before the end).
+        """
+        if self._digest is None:
+            while self.read(65536):
+                pass
+            self._digest = self._hash.digest()
+        return self._digest
+
+
+class FeedClient:
+    """
+    HTTP client of the Waze feeds, persistent sessions (keep-alive, TLS reuse) for every fetch. The client is
+    shared by the scheduler threads, every thread gets its own requests.Session (a session is not thread-safe),
+    the validators and the counters are guarded by a lock.
+
+    Responses are requested compressed and conditionally (If-None-Match/If-Modified-Since with the validators
+    of the last ingested payload). The content-hash of the last ingested payload of each feed is kept as well,
+    so a payload identical to it can be skipped even when the server does not support conditional requests.
+    Validators are updated only by commit, after the payload was ingested, a failed ingest is retried
+    with the next download.
+    """
+
+    def __init__(self, connect_timeout=5.0, read_timeout=30.0, retries=3, backoff_seconds=1.0,
+                 max_backoff_seconds=30.0):
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+
+        # thread -> requests.Session, all sessions are kept to be closed by close()
+        self._local = threading.local()
+        self._sessions = []
+
+        # url -> (ETag, Last-Modified, content-hash) of the last ingested payload
+        self._validators = {}
+        self._lock = threading.Lock()
+
+        # fetch metrics
+        self.requests = 0
+        self.retried = 0
+        self.not_modified = 0
+        self.unchanged = 0
+
+    @property
+    def session(self):
+        """
+        requests.Session of the current thread.
+        """
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+            with self._lock:
+                self._sessions.append(session)
+        return session
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _conditional_headers(self, url):
+        with self._lock:
+            etag, last_modified, _ = self._validators.get(url, (None, None, None))
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def _get(self, url):
+        """
+        GET with retries, exponential backoff and jitter on connection errors, timeouts and RETRY_STATUS_CODES.
+        Only the request and the response headers are retried, the body is streamed by the caller.
+        """
+        attempt = 0
+        while True:
+            self._count("requests")
+            try:
+                response = self.session.get(url, headers=self._conditional_headers(url), timeout=self.timeout,
+                                            stream=True)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    if response.status_code >= 400:
+                        # not retried (e.g. 401, 404), the connection goes back to the pool
+                        response.close()
+                        response.raise_for_status()
+                    return response
+                error = requests.HTTPError(f"{response.status_code} {response.reason}", response=response)
+                response.close()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+
+            attempt += 1
+            if attempt > self.retries:
+                raise error
+            self._count("retried")
+            delay = backoff_delay(attempt, self.backoff_seconds, self.max_backoff_seconds)
+            print(f"[{datetime.now()}] Fetching {url} failed ({error}), retrying in {delay:.1f} s")
+            time.sleep(delay)
+
+    @contextmanager
+    def fetch(self, url):
+        """
+        Downloads the feed.
+
+        :return: FeedPayload, with not_modified set when the server answered 304 Not Modified
+        """
+        response = self._get(url)
+        if response.status_code == 304:
+            response.close()
+            self._count("not_modified")
+            yield FeedPayload()
+            return
+
+        with response:
+            response.raw.decode_content = True
+            yield FeedPayload(response)
+
+    def is_unchanged(self, url, payload):
+        """
+        True when the payload was not modified or has the same content-hash as the last ingested one.
+        """
+        if payload.not_modified:
+            return True
+        with self._lock:
+            _, _, last_digest = self._validators.get(url, (None, None, None))
+        if last_digest is not None and payload.digest() == last_digest:
+            self._count("unchanged")
+            return True
+        return False
+
+    def commit(self, url, payload):
+        """
+        Remembers the validators and the content-hash of an ingested payload.
+        """
+        if payload.not_modified:
+            return
+        with self._lock:
+            self._validators[url] = (payload.etag, payload.last_modified, payload.digest())
+
+    def close(self):
+        with self._lock:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            session.close()
@@ -0,0 +1,37 @@
+import json
+
+
+def route_feed_dict(data, router, regions=()):
+    """
+    Splits a parsed feed (json.loads) to regions, every item goes to the batch of its region.
+    The RegionRouter groups each of alerts and jams by city in one pass (RegionRouter.split).
+
+    :param data: feed dict with the "alerts" and "jams" lists
+    :param router: region_routing.RegionRouter
+    :param regions: regions that get a batch even when no item is routed to them
+    :return: dict region name -> (alerts, jams)
+    """
+    alerts = router.split("alerts", data.get("alerts", []))
+    jams = router.split("jams", data.get("jams", []))
+    return {region: (alerts.get(region, []), jams.get(region, []))
+            for region in dict.fromkeys([*regions, *alerts, *jams])}
+
+
+def get_region_batches(client, url, router, regions=()):
+    """
+    Downloads the feed with the FeedClient and returns the items already split to regions.
+    The whole body is read and the content-hash is checked before parsing. json.loads of the whole body
+    is faster and needs less memory than parsing the response incrementally with ijson
+    (benchmarks/bench_feed_parse.py), and the region writes need the complete feed anyway.
+
+    :param client: queries_feed_client.FeedClient
+    :return: tuple (dict region name -> (alerts, jams), or None when the feed is not modified or identical
+             to the last ingested payload; FeedPayload to commit to the client after the ingest)
+    """
+    with client.fetch(url) as payload:
+        if payload.not_modified:
+            return None, payload
+        body = payload.read()
+        if client.is_unchanged(url, payload):
+            return None, payload
+        return route_feed_dict(json.loads(body), router, regions), payload
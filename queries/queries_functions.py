@@ -1,8 +1,18 @@
+import time
 from datetime import datetime, timedelta
 
-from queries.QUERIES import DEACTIVATE_OLD_ALERTS_QUERY, SUM_STATISTICS_INSERT_QUERY, JAM_HOURLY_QUERY, ALERT_HOURLY_QUERY
+from queries.QUERIES import (DEACTIVATE_OLD_ALERTS_QUERY, DEACTIVATE_OLD_ITEMS_QUERY, ACTIVE_HORIZON_QUERY,
+                             SUM_STATISTICS_INSERT_QUERY, JAM_HOURLY_QUERY, ALERT_HOURLY_QUERY,
+                             GET_STATISTICS_WATERMARK_QUERY, SET_STATISTICS_WATERMARK_QUERY, DB_NOW_QUERY,
+                             CREATE_STATISTICS_WATERMARK_TABLE_QUERY, SEGMENTS_NATURAL_KEY_EXISTS_QUERY,
+                             DEDUPLICATE_SEGMENTS_QUERY, CREATE_SEGMENTS_NATURAL_KEY_QUERY,
+                             SUM_STATISTICS_RANGE_SELECT, SUM_STATISTICS_RANGE_INSERT_QUERY,
+                             JAM_HOURLY_BOUNDED_QUERY, ALERT_HOURLY_BOUNDED_QUERY, CREATE_STATISTICS_CAGG_QUERIES)
+from cons.CONF_INGEST import STATISTICS_QUERY_MODE, STATISTICS_LOOKBACK
 from helpers import round_to_hour
 
+STATISTICS_WATERMARK_NAME = "sum_statistics"
+
 
 def deactive_queries(cursor, table_name):
     """
@@ -16,6 +26,72 @@ def deactive_queries(cursor, table_name):
     cursor.execute(query)
     affected_rows = cursor.rowcount
     print(f"{affected_rows} alert(s) deactivated in '{table_name}'.")
+    return affected_rows
+
+
+def deactive_all_queries(cursor, as_of=None, min_published_at=None):
+    """
+    Same as deactive_queries for both alerts and jams, in one statement.
+
+    :param cursor:
+    :param as_of: time of the ingested snapshot, None for now (live ingest)
+    :param min_published_at: no active row is published before this time (DeactivationHorizon),
+                             older chunks are skipped, None to check all of them
+    :return: tuple (deactivated alerts, deactivated jams)
+    """
+    cursor.execute(DEACTIVATE_OLD_ITEMS_QUERY, {"as_of": as_of, "min_published_at": min_published_at})
+    alerts_deactivated, jams_deactivated = cursor.fetchone()
+    print(f"{alerts_deactivated} alert(s) deactivated in 'alerts'.")
+    print(f"{jams_deactivated} jam(s) deactivated in 'jams'.")
+    return alerts_deactivated, jams_deactivated
+
+
+def get_active_horizon(cursor, min_published_at=None):
+    """
+    Returns the earliest published_at of the active alerts and jams, None when there are none.
+    """
+    cursor.execute(ACTIVE_HORIZON_QUERY, {"min_published_at": min_published_at})
+    return cursor.fetchone()[0]
+
+
+class DeactivationHorizon:
+    """
+    Lower bound of published_at of the active alerts/jams of one region, kept across ingest cycles, so that
+    the deactivation reads only the chunks that can still contain active rows. No maximum lifetime of an
+    item is assumed: the bound is the earliest published_at of the rows left active by the previous cycle,
+    lowered by the items of the current feed (they can insert or reactivate older rows).
+
+    Rows activated outside the ingest loop (historical loader, replay) are caught by a full pass over all
+    chunks every full_pass_seconds.
+    """
+
+    def __init__(self, full_pass_seconds):
+        self.full_pass_seconds = full_pass_seconds
+        self.value = None
+        self.full_pass_at = None
+
+    def bound(self, feed_published_at):
+        """
+        :param feed_published_at: earliest published_at of the items of the current feed (earliest_published)
+        :return: min_published_at for deactive_all_queries/get_active_horizon, None for a full pass
+        """
+        if self.full_pass_at is None or time.monotonic() - self.full_pass_at >= self.full_pass_seconds:
+            return None
+        if self.value is None or feed_published_at is None:
+            return self.value or feed_published_at
+        return min(self.value, feed_published_at)
+
+    def update(self, bound, active_horizon):
+        """
+        Stores the horizon of a committed cycle.
+
+        :param bound: the bound the cycle ran with (None = full pass)
+        :param active_horizon: result of get_active_horizon
+        """
+        if bound is None:
+            self.full_pass_at = time.monotonic()
+        # no active rows: the next feed items are the only candidates
+        self.value = active_horizon if active_horizon is not None else bound
 
 
 def insert_sum_statistics(cursor, start_time, jam_stats, alert_stats):
@@ -41,7 +117,7 @@ def insert_sum_statistics(cursor, start_time, jam_stats, alert_stats):
     cursor.execute(SUM_STATISTICS_INSERT_QUERY, data)
 
 
-def run_statistics(cursor, stat_time_str=None):
+def run_statistics(cursor, stat_time_str=None, set_based=False):
     """
     Calculates and inserts statistics for one or multiple hours.
 
@@ -51,6 +127,7 @@ def run_statistics(cursor, stat_time_str=None):
 
     :param cursor: psycopg2 cursor
     :param stat_time_str: Optional string "DD.MM.YYYY HH:MM"
+    :param set_based: calculate all full hours with one statement (calculate_statistics_range)
     """
     now = round_to_hour(datetime.utcnow())
 
@@ -65,6 +142,10 @@ def run_statistics(cursor, stat_time_str=None):
         # Only current hour
         start_time = now
 
+    if set_based and start_time < now:
+        calculate_statistics_range(cursor, start_time, now)
+        start_time = now
+
     # Loop for each full hour
     while start_time < now:
         calculate_statistics_step(cursor, start_time)
@@ -75,6 +156,38 @@ def run_statistics(cursor, stat_time_str=None):
         calculate_statistics_step(cursor, start_time)
 
 
+def statistics_lookback():
+    """
+    published_at lookback of the statistics queries, None for the exact calculation (STATISTICS_QUERY_MODE).
+    """
+    return STATISTICS_LOOKBACK if STATISTICS_QUERY_MODE == "bounded" else None
+
+
+def fetch_statistics_step(cursor, start_time):
+    """
+    Jam and alert statistics of one hour with the configured STATISTICS_QUERY_MODE.
+
+    :return: tuple (jam stats row, alert stats row)
+    """
+    end_time = start_time + timedelta(hours=1)
+
+    if STATISTICS_QUERY_MODE == "bounded":
+        params = {"start": start_time, "end": end_time, "lookback": STATISTICS_LOOKBACK}
+        cursor.execute(JAM_HOURLY_BOUNDED_QUERY, params)
+        jam_stats = cursor.fetchone()
+
+        cursor.execute(ALERT_HOURLY_BOUNDED_QUERY, params)
+        alert_stats = cursor.fetchone()
+    else:
+        cursor.execute(JAM_HOURLY_QUERY, (start_time, end_time, start_time, start_time))
+        jam_stats = cursor.fetchone()
+
+        cursor.execute(ALERT_HOURLY_QUERY, (start_time, end_time, start_time, start_time))
+        alert_stats = cursor.fetchone()
+
+    return jam_stats, alert_stats
+
+
 def calculate_statistics_step(cursor, start_time):
     """
     Function calculates statistics for given hour (based on start time)
@@ -82,16 +195,138 @@ def calculate_statistics_step(cursor, start_time):
     :param cursor: psycopg2 cursor
     :param start_time: Hour for which statistics are calculated
     """
-    end_time = start_time + timedelta(hours=1)
-
     # Fetch stats
-    cursor.execute(JAM_HOURLY_QUERY, (start_time, end_time, start_time, start_time))
-    jam_stats = cursor.fetchone()
-
-    cursor.execute(ALERT_HOURLY_QUERY, (start_time, end_time, start_time, start_time))
-    alert_stats = cursor.fetchone()
+    jam_stats, alert_stats = fetch_statistics_step(cursor, start_time)
 
     # Store to database
     insert_sum_statistics(cursor, start_time, jam_stats, alert_stats)
 
-    print(f"Processed stats for hour: {start_time.strftime('%Y-%m-%d %H:%M')}")
\ No newline at end of file
+    print(f"Processed stats for hour: {start_time.strftime('%Y-%m-%d %H:%M')}")
+
+
+def calculate_statistics_range(cursor, start_time, end_time):
+    """
+    Function calculates statistics for all hours in [start_time, end_time) with one statement
+    and stores them to the database. Gives the same results as calling calculate_statistics_step
+    for every hour.
+
+    :param cursor: psycopg2 cursor
+    :param start_time: First hour (rounded to the hour)
+    :param end_time: End of the range (rounded to the hour, excluded)
+    """
+    cursor.execute(SUM_STATISTICS_RANGE_INSERT_QUERY,
+                   {"start": start_time, "end": end_time, "lookback": statistics_lookback()})
+
+    print(f"Processed stats for {cursor.rowcount} hours: {start_time.strftime('%Y-%m-%d %H:%M')} - "
+          f"{end_time.strftime('%Y-%m-%d %H:%M')}")
+
+
+def fetch_statistics_range(cursor, start_time, end_time):
+    """
+    Same calculation as calculate_statistics_range, but the rows are returned instead of stored.
+
+    :return: list of tuples in the column order of sum_statistics
+    """
+    cursor.execute(SUM_STATISTICS_RANGE_SELECT,
+                   {"start": start_time, "end": end_time, "lookback": statistics_lookback()})
+    return cursor.fetchall()
+
+
+def create_statistics_watermark_table(cursor):
+    """
+    Creates the statistics_watermark table when it does not exist (databases initialized before
+    init.sql had it), the incremental statistics and the backfill read and write it.
+    """
+    cursor.execute(CREATE_STATISTICS_WATERMARK_TABLE_QUERY)
+
+
+def get_statistics_watermark(cursor):
+    """
+    Returns time of the last statistics run stored in the database, None if statistics never ran.
+    """
+    cursor.execute(GET_STATISTICS_WATERMARK_QUERY, (STATISTICS_WATERMARK_NAME,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def set_statistics_watermark(cursor, watermark):
+    cursor.execute(SET_STATISTICS_WATERMARK_QUERY, (STATISTICS_WATERMARK_NAME, watermark))
+
+
+def run_statistics_incremental(cursor, earliest_inserted=None):
+    """
+    Recalculates only the hours that could have changed since the last run (the watermark).
+
+    Already known jams and alerts touched since the watermark only moved last_updated from about
+    the previous run to now, which changes the hours from one hour before the watermark up to the
+    current, still open hour. A row inserted since the watermark can have a published_at hours
+    back (old pubMillis in the feed, replayed snapshots) and counts in every hour from published_at
+    on, so the recalculation starts at the earliest published_at of the inserted rows when that is older.
+    Older hours are recalculated by the backfill command (run_statistics_backfill.py).
+
+    Limit: a row reactivated after being inactive for more than an hour (back in the feed after a gap)
+    moves last_updated over the hours of the gap, the gap hours before the watermark - 1 hour keep
+    the old counts until run_statistics_backfill.py recalculates them.
+
+    :param cursor: psycopg2 cursor
+    :param earliest_inserted: earliest published_at of the jams/alerts inserted since the watermark
+                              (ingest_feed_copy, insert_alerts/insert_jams and their batch variants),
+                              None when nothing was inserted
+    :return: number of recalculated hours
+    """
+    cursor.execute(DB_NOW_QUERY)
+    run_started_at = cursor.fetchone()[0]
+    now = round_to_hour(run_started_at)
+
+    watermark = get_statistics_watermark(cursor)
+    if watermark is None:
+        print("No statistics watermark found, calculating the current hour only. "
+              "Run run_statistics_backfill.py to fill older hours.")
+        start_time = now
+    else:
+        start_time = min(round_to_hour(watermark - timedelta(hours=1)), now)
+    if earliest_inserted is not None:
+        start_time = min(start_time, round_to_hour(earliest_inserted))
+
+    hours = 0
+    while start_time <= now:
+        calculate_statistics_step(cursor, start_time)
+        start_time += timedelta(hours=1)
+        hours += 1
+
+    set_statistics_watermark(cursor, run_started_at)
+    return hours
+
+
+def create_statistics_caggs(cursor):
+    """
+    Creates the continuous aggregates of the "timescale" statistics backend and their refresh policies,
+    existing ones are kept. Every statement is executed on its own, TimescaleDB does not allow continuous
+    aggregates to be created inside a multi-statement query.
+
+    :param cursor: psycopg2 cursor
+    """
+    for query in CREATE_STATISTICS_CAGG_QUERIES:
+        cursor.execute(query)
+
+
+def create_segments_natural_key(cursor):
+    """
+    Creates the natural key of segments used by ON CONFLICT of the segment inserts in databases initialized
+    before init.sql had it, the duplicate segments are deleted first. Nothing is done when the key exists,
+    compact_segments.py also reclaims the space of the deleted rows.
+
+    :param cursor: psycopg2 cursor, the caller commits
+    :return: number of deleted duplicate segments, None when the key already existed
+    """
+    cursor.execute(SEGMENTS_NATURAL_KEY_EXISTS_QUERY)
+    if cursor.fetchone()[0]:
+        return None
+
+    # the live ingest can not insert new duplicates between the delete and the index
+    cursor.execute("LOCK TABLE segments IN SHARE ROW EXCLUSIVE MODE;")
+    cursor.execute(DEDUPLICATE_SEGMENTS_QUERY)
+    deleted = cursor.rowcount
+    cursor.execute(CREATE_SEGMENTS_NATURAL_KEY_QUERY)
+    print(f"Segments natural key created, {deleted} duplicate segment(s) deleted.")
+    return deleted
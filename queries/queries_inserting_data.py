@@ -1,32 +1,116 @@
-import requests
 import psycopg2
-from shapely.geometry import LineString
+from psycopg2.extras import execute_values
 
+from helpers import linestring_ewkb
+from queries.QUERIES import (ALERTS_BATCH_UPSERT_QUERY, ALERTS_BATCH_UPSERT_TEMPLATE, JAMS_BATCH_UPSERT_QUERY,
+                             JAMS_BATCH_UPSERT_TEMPLATE, EXECUTE_UPSERT_ALERT_QUERY, EXECUTE_UPSERT_JAM_QUERY,
+                             INSERT_SEGMENTS_QUERY)
 from queries.queries_functions import deactive_queries
+from queries.queries_validation import RejectLog, valid_alerts_mask
 
-
-def get_data(url):
-    response = requests.get(url)
-    response.raise_for_status()
-    return response.json()
+BATCH_PAGE_SIZE = 1000
 
 
 def connect(db_config):
     return psycopg2.connect(**db_config)
 
 
-def insert_alerts(cursor, alerts):
-    for alert in alerts:
+def earliest_inserted(rows, earliest=None):
+    """
+    Earliest published_at of the upserted rows that were inserted, not only updated.
+
+    :param rows: (inserted, published_at) rows returned by the upserts
+    :param earliest: earliest published_at found so far, None when there is none
+    """
+    for inserted, published_at in rows:
+        if inserted and (earliest is None or published_at < earliest):
+            earliest = published_at
+    return earliest
+
+
+def record_key(record, pub_millis_index):
+    """
+    (uuid, pubMillis) of an upsert record, the same key as queries_feed_cache.item_key of its feed item.
+    """
+    return str(record[0]), record[pub_millis_index]
+
+
+def alert_to_record(alert):
+    """
+    Converts alert from the Waze feed to the tuple of parameters used by the alert upserts.
+    """
+    return (
+        alert["uuid"],
+        alert.get("country"),
+        alert.get("city"),
+        alert.get("reportRating"),
+        alert.get("reportByMunicipalityUser", "false") == "true",
+        alert.get("confidence"),
+        alert.get("reliability"),
+        alert.get("type"),
+        alert.get("subtype"),
+        alert.get("street"),
+        alert.get("roadType"),
+        alert.get("magvar"),
+        alert.get("reportDescription"),
+        alert["location"]["x"],
+        alert["location"]["y"],
+        alert["pubMillis"]
+    )
+
+
+def jam_to_record(jam):
+    """
+    Converts jam from the Waze feed to the tuple of parameters used by the jam upserts,
+    the line is encoded as EWKB (bytes, sent as bytea).
+    """
+    return (
+        str(jam["uuid"]),
+        jam.get("country"),
+        jam.get("level"),
+        jam.get("city"),
+        jam.get("speedKMH"),
+        jam.get("length"),
+        jam.get("turnType"),
+        jam.get("endNode"),
+        jam.get("startNode"),
+        jam.get("speed"),
+        jam.get("roadType"),
+        jam.get("delay"),
+        jam.get("street"),
+        jam.get("pubMillis"),
+        linestring_ewkb(jam["line"]),
+        jam.get("blockingAlertUuid")
+    )
+
+
+def insert_alerts(cursor, alerts, prepared=False, deactivate=True):
+    """
+    Upserts alerts one by one.
+
+    :param cursor: psycopg2 cursor
+    :param alerts: list of alerts from the Waze feed
+    :param prepared: use the server-side prepared statement upsert_alert (see RegionConnectionPool)
+    :param deactivate: deactivate old alerts afterwards, the caller deactivates them itself when False
+    :return: tuple (list of (uuid, pubMillis) of the upserted alerts,
+             earliest published_at of the inserted alerts or None)
+    """
+    upserted = []
+    earliest = None
+    rejects = RejectLog("alert")
+    valid = valid_alerts_mask(alerts, rejects)
+    rejects.report()
+    for alert, is_valid in zip(alerts, valid):
+        if not is_valid:
+            continue
+        # a failed alert is rolled back to the savepoint, the rest of the transaction goes on
+        cursor.execute("SAVEPOINT upsert_alert;")
+        record = alert_to_record(alert)
         try:
-            # print(f"Processing alert {alert}: {alert['uuid']}")
-            # print("x =", alert["location"].get("x"))
-            # print("y =", alert["location"].get("y"))
-            # print("pubMillis =", alert.get("pubMillis"))
-
-            if (not isinstance(alert["location"]["x"], (int, float))
-                    or not isinstance(alert["location"]["y"], (int, float))
-                    or not isinstance(alert["pubMillis"],(int, float))):
-                print(f"Skipping alert {alert} due to invalid coordinates or pubMillis")
+            if prepared:
+                cursor.execute(EXECUTE_UPSERT_ALERT_QUERY, record)
+                earliest = earliest_inserted(cursor.fetchall(), earliest)
+                upserted.append(record_key(record, 15))
                 continue
 
             cursor.execute("""
@@ -37,65 +121,141 @@ def insert_alerts(cursor, alerts):
                     ST_SetSRID(ST_MakePoint(%s, %s), 4326), to_timestamp(%s / 1000.0), now(), TRUE)
                 ON CONFLICT (uuid, published_at) DO UPDATE SET
                     last_updated = now(),
-                    active = TRUE;
-            """, (
-                alert["uuid"],
-                alert.get("country"),
-                alert.get("city"),
-                alert.get("reportRating"),
-                alert.get("reportByMunicipalityUser", "false") == "true",
-                alert.get("confidence"),
-                alert.get("reliability"),
-                alert.get("type"),
-                alert.get("subtype"),
-                alert.get("street"),
-                alert.get("roadType"),
-                alert.get("magvar"),
-                alert.get("reportDescription"),
-                alert["location"]["x"],
-                alert["location"]["y"],
-                alert["pubMillis"]
-            ))
-        except Exception as e:
+                    active = TRUE
+                RETURNING (xmax = 0) AS inserted, published_at;
+            """, record)
+            earliest = earliest_inserted(cursor.fetchall(), earliest)
+            upserted.append(record_key(record, 15))
+        except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT upsert_alert;")
             print(e)
+        cursor.execute("RELEASE SAVEPOINT upsert_alert;")
+
+    if deactivate:
+        deactive_queries(cursor, "alerts")
+    return upserted, earliest
 
-    deactive_queries(cursor, "alerts")
 
+def insert_jams(cursor, jams, prepared=False, deactivate=True):
+    """
+    Upserts jams one by one.
 
-def insert_jams(cursor, jams):
+    :param cursor: psycopg2 cursor
+    :param jams: list of jams from the Waze feed
+    :param prepared: use the server-side prepared statement upsert_jam (see RegionConnectionPool)
+    :param deactivate: deactivate old jams afterwards, the caller deactivates them itself when False
+    :return: tuple (list of (uuid, pubMillis) of the upserted jams,
+             earliest published_at of the inserted jams or None)
+    """
+    upserted = []
+    earliest = None
     for jam in jams:
-        coords = [(pt["x"], pt["y"]) for pt in jam["line"]]
-        linestring = LineString(coords)
+        record = jam_to_record(jam)
+        upserted.append(record_key(record, 13))
+        if prepared:
+            cursor.execute(EXECUTE_UPSERT_JAM_QUERY, record)
+            earliest = earliest_inserted(cursor.fetchall(), earliest)
+            continue
+
         cursor.execute("""
             INSERT INTO jams (uuid, country, jam_level, city, speed_kmh, jam_length, turn_type,
                 end_node, start_node, speed, road_type, delay, street, published_at, jam_line,
                 blocking_alert_uuid, last_updated, active)
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,%s,
-                to_timestamp(%s / 1000.0), ST_SetSRID(ST_GeomFromText(%s), 4326),
+                to_timestamp(%s / 1000.0), ST_GeomFromEWKB(%s),
                 %s, now(), TRUE)
             ON CONFLICT (uuid, published_at) DO UPDATE SET
                 last_updated = now(),
-                active = TRUE;
-        """, (
-            str(jam["uuid"]),
-            jam.get("country"),
-            jam.get("level"),
-            jam.get("city"),
-            jam.get("speedKMH"),
-            jam.get("length"),
-            jam.get("turnType"),
-            jam.get("endNode"),
-            jam.get("startNode"),
-            jam.get("speed"),
-            jam.get("roadType"),
-            jam.get("delay"),
-            jam.get("street"),
-            jam.get("pubMillis"),
-            linestring.wkt,
-            jam.get("blockingAlertUuid")
-        ))
-
-    deactive_queries(cursor, "jams")
+                active = TRUE
+            RETURNING (xmax = 0) AS inserted, published_at;
+        """, record)
+        earliest = earliest_inserted(cursor.fetchall(), earliest)
+
+    if deactivate:
+        deactive_queries(cursor, "jams")
+    return upserted, earliest
+
+
+def _dedupe_records(records, uuid_index, pub_millis_index):
+    """
+    Keeps only the last record for every (uuid, pubMillis) key. One multi-row
+    INSERT ... ON CONFLICT DO UPDATE can not touch the same row twice.
+    """
+    unique_records = {}
+    for record in records:
+        unique_records[(record[uuid_index], record[pub_millis_index])] = record
+    return list(unique_records.values())
+
+
+def alerts_to_records(alerts, rejects=None):
+    """
+    Validates and converts the whole alerts feed to upsert records, invalid alerts are skipped
+    and duplicate (uuid, pubMillis) keys are dropped.
+
+    :param alerts: list of alerts from the Waze feed
+    :param rejects: RejectLog the invalid alerts are counted in, by default a new one reported here
+    :return: list of tuples (see alert_to_record)
+    """
+    report = rejects is None
+    if report:
+        rejects = RejectLog("alert")
+    valid = valid_alerts_mask(alerts, rejects)
+    if report:
+        rejects.report()
+
+    records = [alert_to_record(alert) for alert, is_valid in zip(alerts, valid) if is_valid]
+    return _dedupe_records(records, 0, 15)
+
+
+def jams_to_records(jams):
+    """
+    Converts the whole jams feed to upsert records, duplicate (uuid, pubMillis) keys are dropped.
+
+    :param jams: list of jams from the Waze feed
+    :return: list of tuples (see jam_to_record)
+    """
+    return _dedupe_records([jam_to_record(jam) for jam in jams], 0, 13)
+
+
+def insert_alerts_batch(cursor, alerts, page_size=BATCH_PAGE_SIZE, deactivate=True):
+    """
+    Batched variant of insert_alerts. The whole feed is validated and converted first,
+    then upserted with multi-row statements (one round trip per page_size alerts).
+
+    :param cursor: psycopg2 cursor
+    :param alerts: list of alerts from the Waze feed
+    :param page_size: number of rows sent in one statement
+    :param deactivate: deactivate old alerts afterwards, the caller deactivates them itself when False
+    :return: tuple (list of (uuid, pubMillis) of the upserted alerts,
+             earliest published_at of the inserted alerts or None)
+    """
+    records = alerts_to_records(alerts)
+    upserted_rows = execute_values(cursor, ALERTS_BATCH_UPSERT_QUERY, records,
+                                   template=ALERTS_BATCH_UPSERT_TEMPLATE, page_size=page_size, fetch=True)
+
+    if deactivate:
+        deactive_queries(cursor, "alerts")
+    return [record_key(record, 15) for record in records], earliest_inserted(upserted_rows)
+
+
+def insert_jams_batch(cursor, jams, page_size=BATCH_PAGE_SIZE, deactivate=True):
+    """
+    Batched variant of insert_jams, see insert_alerts_batch.
+
+    :param cursor: psycopg2 cursor
+    :param jams: list of jams from the Waze feed
+    :param page_size: number of rows sent in one statement
+    :param deactivate: deactivate old jams afterwards, the caller deactivates them itself when False
+    :return: tuple (list of (uuid, pubMillis) of the upserted jams,
+             earliest published_at of the inserted jams or None)
+    """
+    records = jams_to_records(jams)
+    upserted_rows = execute_values(cursor, JAMS_BATCH_UPSERT_QUERY, records,
+                                   template=JAMS_BATCH_UPSERT_TEMPLATE, page_size=page_size, fetch=True)
+
+    if deactivate:
+        deactive_queries(cursor, "jams")
+    return [record_key(record, 13) for record in records], earliest_inserted(upserted_rows)
 
 
 def extract_segments_from_jams(jams):
@@ -116,3 +276,13 @@ def extract_segments_from_jams(jams):
 
     return segments_data
 
+
+def insert_segments(cursor, segments, page_size=BATCH_PAGE_SIZE):
+    """
+    Inserts segments with multi-row statements, segments already stored for the jam are skipped.
+
+    :param cursor: psycopg2 cursor
+    :param segments: list of tuples from extract_segments_from_jams
+    :param page_size: number of rows sent in one statement
+    """
+    execute_values(cursor, INSERT_SEGMENTS_QUERY, segments, page_size=page_size)
@@ -0,0 +1,155 @@
+import gzip
+import json
+import os
+import queue
+import threading
+from datetime import datetime, timezone, timedelta
+
+# compression -> file suffix
+ARCHIVE_SUFFIXES = {
+    "zstd": ".ndjson.zst",
+    "gzip": ".ndjson.gz",
+}
+
+SNAPSHOT_TIME_FORMAT = "%Y%m%dT%H%M%SZ"
+
+
+def region_directory(root, region, day):
+    """
+    Directory of the snapshots of one region and day (UTC): root/region=JMK/date=2024-04-25
+    """
+    return os.path.join(root, f"region={region.replace(' ', '_')}", f"date={day.strftime('%Y-%m-%d')}")
+
+
+def _open_compressed(path, mode, compression, level=None):
+    if compression == "zstd":
+        # optional dependency, only needed when the archive is enabled with zstd
+        import zstandard
+        if "w" in mode:
+            return zstandard.open(path, mode, cctx=zstandard.ZstdCompressor(level=level or 3), encoding="utf-8")
+        return zstandard.open(path, mode, encoding="utf-8")
+    return gzip.open(path, mode, compresslevel=level or 6, encoding="utf-8")
+
+
+def write_snapshot(root, region, fetched_at, alerts, jams, compression="zstd", level=None):
+    """
+    Writes the alerts and jams of one region from one feed download as compressed NDJSON,
+    one line {"kind": "alerts" or "jams", "item": {...}} per feed item.
+    The file is written under a temporary name and renamed, readers never see a partial snapshot.
+
+    :param fetched_at: timezone-aware time of the download, part of the file name
+    :return: path of the snapshot
+    """
+    fetched_at = fetched_at.astimezone(timezone.utc)
+    directory = region_directory(root, region, fetched_at)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, fetched_at.strftime(SNAPSHOT_TIME_FORMAT) + ARCHIVE_SUFFIXES[compression])
+
+    tmp_path = path + ".tmp"
+    with _open_compressed(tmp_path, "wt", compression, level) as f:
+        for kind, items in (("alerts", alerts), ("jams", jams)):
+            for item in items:
+                f.write(json.dumps({"kind": kind, "item": item}, ensure_ascii=False, separators=(",", ":")))
+                f.write("\n")
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_snapshot(path):
+    """
+    :return: tuple (alerts, jams) of a snapshot written by write_snapshot
+    """
+    compression = next(name for name, suffix in ARCHIVE_SUFFIXES.items() if path.endswith(suffix))
+    batch = {"alerts": [], "jams": []}
+    with _open_compressed(path, "rt", compression) as f:
+        for line in f:
+            record = json.loads(line)
+            batch[record["kind"]].append(record["item"])
+    return batch["alerts"], batch["jams"]
+
+
+def iter_snapshot_paths(root, region, start, end):
+    """
+    Snapshots of the region downloaded in [start, end), ordered by the download time.
+
+    :param start: timezone-aware datetime
+    :param end: timezone-aware datetime
+    :return: generator of tuples (fetched_at, path)
+    """
+    start = start.astimezone(timezone.utc)
+    end = end.astimezone(timezone.utc)
+    day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    while day < end:
+        directory = region_directory(root, region, day)
+        if os.path.isdir(directory):
+            for name in sorted(os.listdir(directory)):
+                suffix = next((suffix for suffix in ARCHIVE_SUFFIXES.values() if name.endswith(suffix)), None)
+                if suffix is None:
+                    continue
+                fetched_at = datetime.strptime(name[:-len(suffix)], SNAPSHOT_TIME_FORMAT).replace(tzinfo=timezone.utc)
+                if start <= fetched_at < end:
+                    yield fetched_at, os.path.join(directory, name)
+        day += timedelta(days=1)
+
+
+class SnapshotArchiveWriter:
+    """
+    Background writer of the feed snapshots, the ingest cycle only puts the region batches to a bounded queue.
+
+    When the writer falls behind (slow disk), new snapshots are dropped and counted instead of blocking
+    the ingest. Write errors are logged and counted, they never reach the ingest loop.
+    """
+
+    def __init__(self, root, compression="zstd", level=None, max_pending=32):
+        if compression not in ARCHIVE_SUFFIXES:
+            raise ValueError(f"Unknown snapshot compression '{compression}', use one of {list(ARCHIVE_SUFFIXES)}")
+        self.root = root
+        self.compression = compression
+        self.level = level
+
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name="snapshot-archive", daemon=True)
+        self._thread.start()
+
+        # archive metrics
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def submit(self, region, fetched_at, alerts, jams):
+        """
+        Queues a snapshot for writing, never blocks. The lists are only read by the writer.
+
+        :return: True if queued, False if dropped
+        """
+        try:
+            self._queue.put_nowait((region, fetched_at, alerts, jams))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            print(f"[{datetime.now()}] Snapshot archive is behind, snapshot of {region} at {fetched_at} dropped")
+            return False
+
+    def _run(self):
+        while True:
+            snapshot = self._queue.get()
+            try:
+                if snapshot is None:
+                    return
+                write_snapshot(self.root, *snapshot, compression=self.compression, level=self.level)
+                self.written += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"[ERROR] Writing snapshot of {snapshot[0]} failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """
+        Waits until all queued snapshots are written.
+        """
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
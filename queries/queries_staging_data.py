@@ -0,0 +1,117 @@
+import io
+
+from queries.QUERIES import CREATE_STAGING_TABLES_QUERY, MERGE_STAGING_TABLES_QUERY
+from queries.queries_functions import deactive_all_queries
+from queries.queries_inserting_data import alerts_to_records, jams_to_records, record_key
+
+ALERTS_STAGE_COLUMNS = (
+    "uuid", "country", "city", "report_rating", "report_by_municipality_user", "confidence", "reliability",
+    "type", "subtype", "street", "road_type", "magvar", "report_description", "x", "y", "pub_millis"
+)
+
+JAMS_STAGE_COLUMNS = (
+    "uuid", "country", "jam_level", "city", "speed_kmh", "jam_length", "turn_type", "end_node", "start_node",
+    "speed", "road_type", "delay", "street", "pub_millis", "jam_line", "blocking_alert_uuid"
+)
+
+SEGMENTS_STAGE_COLUMNS = ("jam_id", "from_node", "to_node", "segment_id", "is_forward")
+
+
+def _escape_copy_text(text):
+    if "\\" in text or "\t" in text or "\n" in text or "\r" in text:
+        return (text
+                .replace("\\", "\\\\")
+                .replace("\t", "\\t")
+                .replace("\n", "\\n")
+                .replace("\r", "\\r"))
+    return text
+
+
+def _copy_value(value):
+    """
+    Formats one value for COPY ... FROM STDIN in the text format.
+    Numbers and plain strings (the bulk of the values) are checked first and need no escaping.
+    """
+    if value is None:
+        return "\\N"
+    value_type = type(value)
+    if value_type is int or value_type is float:
+        return str(value)
+    if value_type is str:
+        return _escape_copy_text(value)
+    if value is True:
+        return "t"
+    if value is False:
+        return "f"
+    if value_type is bytes:
+        # bytea in the hex format, the backslash is escaped for the COPY text format
+        return "\\\\x" + value.hex()
+    return _escape_copy_text(str(value))
+
+
+def records_to_copy_buffer(records):
+    """
+    Writes records (tuples) to an in-memory buffer in the COPY text format.
+
+    :param records: iterable of tuples
+    :return: io.StringIO positioned at the beginning
+    """
+    buffer = io.StringIO()
+    for record in records:
+        buffer.write("\t".join([_copy_value(value) for value in record]))
+        buffer.write("\n")
+    buffer.seek(0)
+    return buffer
+
+
+def copy_records(cursor, table, columns, records):
+    """
+    Streams records into the table with COPY FROM STDIN.
+    """
+    buffer = records_to_copy_buffer(records)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+
+def ingest_feed_copy(cursor, alerts, jams, segments, as_of=None, deactivate=True):
+    """
+    Loads one feed cycle through temporary staging tables. Alerts, jams and segments are
+    streamed to the staging tables with COPY, then applied with one set-based merge
+    (same ON CONFLICT (uuid, published_at) semantics as insert_alerts/insert_jams),
+    followed by the deactivation of alerts and jams that are no longer in the feed.
+
+    :param cursor: psycopg2 cursor
+    :param alerts: list of alerts from the Waze feed
+    :param jams: list of jams from the Waze feed
+    :param segments: list of segment tuples from extract_segments_from_jams
+    :param as_of: time of the snapshot used as last_updated and for the deactivation,
+                  None for now (live ingest), set by the replay of archived snapshots
+    :param deactivate: run the deactivation, the caller runs deactive_all_queries itself when False
+    :return: tuple (dict table -> dict action -> number of rows, actions are "inserted", "updated",
+             "skipped" (invalid or duplicate items) and "deactivated";
+             earliest published_at of the newly inserted alerts and jams, None when nothing was inserted;
+             dict "alerts"/"jams" -> list of (uuid, pubMillis) of the upserted rows)
+    """
+    alert_records = alerts_to_records(alerts)
+    jam_records = jams_to_records(jams)
+
+    cursor.execute(CREATE_STAGING_TABLES_QUERY)
+    copy_records(cursor, "alerts_stage", ALERTS_STAGE_COLUMNS, alert_records)
+    copy_records(cursor, "jams_stage", JAMS_STAGE_COLUMNS, jam_records)
+    copy_records(cursor, "segments_stage", SEGMENTS_STAGE_COLUMNS, segments)
+
+    cursor.execute(MERGE_STAGING_TABLES_QUERY, {"as_of": as_of})
+    (alerts_inserted, alerts_updated, jams_inserted, jams_updated, segments_inserted,
+     earliest_inserted) = cursor.fetchone()
+    counts = {
+        "alerts": {"inserted": alerts_inserted, "updated": alerts_updated,
+                   "skipped": len(alerts) - len(alert_records)},
+        "jams": {"inserted": jams_inserted, "updated": jams_updated, "skipped": len(jams) - len(jam_records)},
+        "segments": {"inserted": segments_inserted, "skipped": len(segments) - segments_inserted},
+    }
+
+    if deactivate:
+        counts["alerts"]["deactivated"], counts["jams"]["deactivated"] = deactive_all_queries(cursor, as_of)
+
+    upserted_keys = {"alerts": [record_key(record, 15) for record in alert_records],
+                     "jams": [record_key(record, 13) for record in jam_records]}
+    return counts, earliest_inserted, upserted_keys
@@ -0,0 +1,170 @@
+import numpy as np
+import pandas as pd
+import shapely
+
+# types accepted as numbers in the Waze feed, bools and numeric strings are rejected
+NUMBER_TYPES = (int, float)
+
+# EPSG:4326 bounds of the coordinates
+LON_RANGE = (-180.0, 180.0)
+LAT_RANGE = (-90.0, 90.0)
+
+
+def numeric_array(values):
+    """
+    Float array of feed values, NaN where the value is not an int or float (None, strings, bools).
+    """
+    return np.fromiter((value if type(value) in NUMBER_TYPES else np.nan for value in values), dtype=float)
+
+
+def wkb_array(values):
+    """
+    Array of shapely geometries of WKB values (hex string or bytes), None where the value is missing
+    or is not valid WKB.
+    """
+    return shapely.from_wkb(np.array([value if isinstance(value, (str, bytes)) else None for value in values],
+                                     dtype=object), on_invalid="ignore")
+
+
+# WKB geometry type codes
+WKB_LINESTRING = 2
+WKB_MULTILINESTRING = 5
+
+
+def _wkb_hex_type(value):
+    try:
+        byte_order = {"00": "big", "01": "little"}[value[:2]]
+        # without the EWKB flags and the ISO Z/M offsets
+        return (int.from_bytes(bytes.fromhex(value[2:10]), byte_order) & 0x0FFFFFFF) % 1000
+    except (TypeError, KeyError, ValueError):
+        return -1
+
+
+def wkb_hex_types(values):
+    """
+    WKB geometry type codes of hex (E)WKB values, read from the header only, the geometry is not parsed.
+    -1 where the value is missing or has no valid header.
+    """
+    return np.fromiter((_wkb_hex_type(value) for value in values), dtype=np.int64)
+
+
+def wkb_points_xy(values):
+    """
+    x and y float arrays of points in WKB (hex string or bytes), e.g. a location column exported from the DB.
+    NaN where the value is missing, is not valid WKB or is not a point.
+    """
+    geometries = wkb_array(values)
+    return shapely.get_x(geometries), shapely.get_y(geometries)
+
+
+def datetime_seconds(values):
+    """
+    Float seconds since the epoch of datetimes (or strings), NaN where missing or not parseable.
+    """
+    times = pd.to_datetime(pd.Series(values), errors="coerce", utc=True, format="mixed")
+    return (times - pd.Timestamp(0, tz="UTC")).dt.total_seconds().to_numpy()
+
+
+def not_null_array(values):
+    return np.fromiter((value is not None for value in values), dtype=bool)
+
+
+def in_range(values, bounds):
+    """
+    True where the value is a finite number within the bounds (NaN is never in range).
+    """
+    return (values >= bounds[0]) & (values <= bounds[1])
+
+
+class RejectLog:
+    """
+    Counts rejected records per failed check and keeps only a few short samples of them,
+    instead of printing every rejected record.
+    """
+
+    def __init__(self, name, max_samples=3):
+        self.name = name
+        self.max_samples = max_samples
+        self.rejected = 0
+        self.counts = {}
+        self.samples = []
+
+    def add(self, checks, mask, describe=None):
+        """
+        :param checks: dict check name -> boolean array (True = valid)
+        :param mask: combined mask of the checks
+        :param describe: function row index -> short description of the row for the samples
+        """
+        rejected = np.flatnonzero(~mask)
+        self.rejected += len(rejected)
+        for check, valid in checks.items():
+            failed = int(len(valid) - np.count_nonzero(valid))
+            if failed:
+                self.counts[check] = self.counts.get(check, 0) + failed
+
+        for index in rejected[:max(0, self.max_samples - len(self.samples))]:
+            failed_checks = [check for check, valid in checks.items() if not valid[index]]
+            sample = describe(index) if describe is not None else f"row {index}"
+            self.samples.append(f"{sample} ({', '.join(failed_checks)})")
+
+    def report(self):
+        if not self.rejected:
+            return
+        counts = ", ".join(f"{check} {count}" for check, count in self.counts.items())
+        print(f"Skipped {self.rejected} {self.name}(s) due to invalid {counts}; e.g. {'; '.join(self.samples)}")
+
+
+def validate_columns(checks, rejects=None, describe=None):
+    """
+    Combines column checks to one mask of valid rows, rejected rows are counted in the RejectLog.
+
+    :param checks: dict check name -> boolean array (True = valid), all of the same length
+    :param rejects: RejectLog or None
+    :param describe: function row index -> short description of the row for the samples of the log
+    :return: boolean array, True for the rows that passed all checks
+    """
+    mask = np.logical_and.reduce(list(checks.values()))
+    if rejects is not None and not mask.all():
+        rejects.add(checks, mask, describe)
+    return mask
+
+
+def point_checks(x, y, time_values):
+    """
+    Checks of the point coordinates (EPSG:4326) and of the time, as float arrays.
+
+    :return: dict check name -> boolean array, see validate_columns
+    """
+    return {
+        "x": in_range(x, LON_RANGE),
+        "y": in_range(y, LAT_RANGE),
+        "time": np.isfinite(time_values),
+    }
+
+
+def valid_alerts_mask(alerts, rejects=None):
+    """
+    Validates the whole alerts batch from the Waze feed at once: uuid present, numeric
+    location x/y within the EPSG:4326 bounds and numeric pubMillis.
+
+    :param alerts: list of alerts from the Waze feed
+    :param rejects: RejectLog or None
+    :return: boolean array, True for the alerts that can be inserted
+    """
+    if not alerts:
+        return np.zeros(0, dtype=bool)
+    locations = [location if isinstance(location, dict) else {}
+                 for location in (alert.get("location") for alert in alerts)]
+    x = numeric_array([location.get("x") for location in locations])
+    y = numeric_array([location.get("y") for location in locations])
+    pub_millis = numeric_array([alert.get("pubMillis") for alert in alerts])
+
+    checks = point_checks(x, y, pub_millis)
+    checks["pubMillis"] = checks.pop("time")
+    checks["uuid"] = not_null_array([alert.get("uuid") for alert in alerts])
+
+    def describe(index):
+        alert = alerts[index]
+        return f"uuid={alert.get('uuid')} location={alert.get('location')} pubMillis={alert.get('pubMillis')!r}"
+
+    return validate_columns(checks, rejects, describe)
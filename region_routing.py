@@ -0,0 +1,241 @@
+import json
+import os
+from itertools import chain
+
+import numpy as np
+import shapely
+from shapely import STRtree
+from shapely.geometry import LineString, Point, Polygon, shape
+from shapely.ops import unary_union
+
+from queries.queries_validation import NUMBER_TYPES, numeric_array
+
+# relative "area" paths of the routes are relative to the repository root
+REPOSITORY_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def item_point(kind, item):
+    """
+    Representative point of a feed item: location of an alert, first point of a jam line.
+    """
+    if kind == "alerts":
+        location = item.get("location") or {}
+        return location.get("x"), location.get("y")
+    line = item.get("line") or [{}]
+    return line[0].get("x"), line[0].get("y")
+
+
+def _is_number(value):
+    # same as numeric_array: bools and numeric strings are not coordinates
+    return type(value) in NUMBER_TYPES
+
+
+def item_geometry(kind, item):
+    """
+    Geometry of a feed item: point of an alert, line of a jam, None when the coordinates are invalid.
+    """
+    if kind == "alerts":
+        x, y = item_point(kind, item)
+        return Point(x, y) if _is_number(x) and _is_number(y) else None
+
+    coords = [(pt.get("x"), pt.get("y")) for pt in item.get("line") or []]
+    if not coords or not all(_is_number(x) and _is_number(y) for x, y in coords):
+        return None
+    return LineString(coords) if len(coords) > 1 else Point(coords[0])
+
+
+def item_geometries(kind, items):
+    """
+    Vectorized item_geometry for a whole batch of alerts or jams.
+
+    :return: numpy array of geometries, None where the coordinates are invalid
+    """
+    geometries = np.full(len(items), None, dtype=object)
+    if kind == "alerts":
+        locations = [item.get("location") or {} for item in items]
+        xs = numeric_array([location.get("x") for location in locations])
+        ys = numeric_array([location.get("y") for location in locations])
+        valid = ~(np.isnan(xs) | np.isnan(ys))
+        geometries[valid] = shapely.points(xs[valid], ys[valid])
+        return geometries
+
+    lines = [item.get("line") or [] for item in items]
+    lengths = np.array([len(line) for line in lines], dtype=np.int64)
+    xs = numeric_array([pt.get("x") for line in lines for pt in line])
+    ys = numeric_array([pt.get("y") for line in lines for pt in line])
+    line_indices = np.repeat(np.arange(len(items)), lengths)
+
+    # jams with an invalid point are left out, like in item_geometry
+    invalid_points = np.isnan(xs) | np.isnan(ys)
+    valid_lines = lengths > 0
+    valid_lines[line_indices[invalid_points]] = False
+
+    multi_point = valid_lines & (lengths > 1)
+    keep = multi_point[line_indices]
+    if keep.any():
+        # linestrings need consecutive indices, one linestring per jam in the order of the jams
+        _, consecutive_indices = np.unique(line_indices[keep], return_inverse=True)
+        geometries[multi_point] = shapely.linestrings(xs[keep], ys[keep], indices=consecutive_indices)
+
+    single_point = valid_lines & (lengths == 1)
+    if single_point.any():
+        first_points = np.cumsum(lengths) - lengths
+        geometries[single_point] = shapely.points(xs[first_points[single_point]], ys[first_points[single_point]])
+    return geometries
+
+
+def load_area(path):
+    """
+    Loads all polygons of a GeoJSON file (FeatureCollection, Feature or geometry) as one geometry,
+    a relative path is relative to the repository root.
+    """
+    path = os.path.join(REPOSITORY_DIR, path)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Region area file {path} not found, add the administrative boundary "
+                                f"(GeoJSON in EPSG:4326) or use REGION_ROUTING_MODE = \"city\"")
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("type") == "FeatureCollection":
+        geometries = [shape(feature["geometry"]) for feature in data["features"]]
+    elif data.get("type") == "Feature":
+        geometries = [shape(data["geometry"])]
+    else:
+        geometries = [shape(data)]
+    return unary_union(geometries)
+
+
+class RegionRouter:
+    """
+    Routes items of one feed to regions by the declarative routes from cons/CONF_REGIONS.py.
+    Every item is evaluated once against the ordered routes and goes to the first matching one.
+
+    mode "city" decides by the Waze 'city' field (the "area" files are not used), mode "spatial" by the
+    administrative polygons (the "city" lists are not used). Inline "polygon" routes apply in both modes.
+    All route geometries of the feed are in one STRtree, so an item costs one index lookup.
+    """
+
+    def __init__(self, routes, mode="city"):
+        if mode not in ("city", "spatial"):
+            raise ValueError(f"Unknown routing mode '{mode}', use 'city' or 'spatial'")
+        self.mode = mode
+        self.regions = tuple(route["region"] for route in routes)
+
+        # route index -> set of cities, None when the route does not check the city
+        self._cities = []
+        # route index -> True when the route has a geometry
+        self._has_geometry = []
+        geometries = []
+        geometry_routes = []
+        for index, route in enumerate(routes):
+            cities = route.get("city") if mode == "city" else None
+            self._cities.append(frozenset(cities) if cities is not None else None)
+
+            route_geometries = []
+            if "polygon" in route:
+                route_geometries.append(Polygon(route["polygon"]))
+            if "area" in route and mode == "spatial":
+                route_geometries.append(load_area(route["area"]))
+            if len(route_geometries) > 1:
+                # both predicates have to match
+                route_geometries = [route_geometries[0].intersection(route_geometries[1])]
+            self._has_geometry.append(bool(route_geometries))
+            for geometry in route_geometries:
+                geometries.append(geometry)
+                geometry_routes.append(index)
+
+        self._tree = STRtree(geometries) if geometries else None
+        self._geometry_routes = np.asarray(geometry_routes, dtype=np.int64)
+
+        # first route that takes everything, len(routes) when there is none
+        self._fallback_route = next((index for index in range(len(routes))
+                                     if not self._has_geometry[index] and self._cities[index] is None), len(routes))
+
+        # routes decided by the city only are resolved with one dict lookup
+        self._city_regions = None
+        self._default_region = None
+        if self._tree is None:
+            self._city_regions = {}
+            for region, cities in zip(self.regions, self._cities):
+                if cities is None:
+                    self._default_region = region
+                    break
+                for city in cities:
+                    self._city_regions.setdefault(city, region)
+
+    def _matching_geometry_routes(self, kind, item):
+        geometry = item_geometry(kind, item)
+        if geometry is None:
+            return ()
+        return set(self._geometry_routes[self._tree.query(geometry, predicate="intersects")].tolist())
+
+    def route_many(self, kind, items):
+        """
+        Routes a whole batch of alerts or jams, with geometries the index is queried once for the batch.
+
+        :return: list of region names (None when no route matches), in the order of items
+        """
+        if self._tree is None or any(cities is not None for cities in self._cities):
+            return [self(kind, item) for item in items]
+
+        geometries = item_geometries(kind, items)
+        valid_indices = np.flatnonzero(geometries != None)  # noqa: E711 (element-wise comparison)
+        item_indices, tree_indices = self._tree.query(geometries[valid_indices], predicate="intersects")
+
+        # the matching route with the lowest index wins, the fallback route when nothing matches
+        best_routes = np.full(len(items), self._fallback_route, dtype=np.int64)
+        np.minimum.at(best_routes, valid_indices[item_indices], self._geometry_routes[tree_indices])
+
+        regions = self.regions + (None,)
+        return [regions[index] for index in best_routes.tolist()]
+
+    def split(self, kind, items):
+        """
+        Splits a whole batch of alerts or jams to regions in one pass.
+
+        :return: dict region name -> list of items, items without a route are dropped. The items of one city
+                 (city mode) or of one region (spatial mode) keep their order.
+        """
+        if self._city_regions is None:
+            batches = {region: [] for region in self.regions}
+            for item, region in zip(items, self.route_many(kind, items)):
+                if region is not None:
+                    batches[region].append(item)
+            return batches
+
+        # city routes: items grouped by city in one pass, then the few city groups are mapped to regions
+        groups = {}
+        get_group = groups.get
+        for item in items:
+            city = item.get("city")
+            group = get_group(city)
+            if group is None:
+                group = groups[city] = []
+            group.append(item)
+        region_groups = {region: [] for region in self.regions}
+        for city, group in groups.items():
+            region = self._city_regions.get(city, self._default_region)
+            if region is not None:
+                region_groups[region].append(group)
+        # a region with a single city takes its group as it is
+        return {region: region_group[0] if len(region_group) == 1 else list(chain.from_iterable(region_group))
+                for region, region_group in region_groups.items()}
+
+    def __call__(self, kind, item):
+        """
+        :param kind: "alerts" or "jams"
+        :param item: alert or jam from the Waze feed
+        :return: region name, None when no route matches
+        """
+        if self._city_regions is not None:
+            return self._city_regions.get(item.get("city"), self._default_region)
+
+        geometry_matches = self._matching_geometry_routes(kind, item)
+        city = item.get("city")
+        for index, region in enumerate(self.regions):
+            if self._has_geometry[index] and index not in geometry_matches:
+                continue
+            cities = self._cities[index]
+            if cities is not None and city not in cities:
+                continue
+            return region
+        return None
@@ -0,0 +1,88 @@
+"""
+Re-ingests archived feed snapshots (SNAPSHOT_ARCHIVE_DIR, written by ingest_waze_data.py) of one region
+into its database, at full speed instead of the 2 minute feed tick.
+
+Every snapshot is ingested in its own transaction through the COPY staging loader, with the snapshot time
+as last_updated and as the reference time of the deactivation, so active/last_updated end up the same as
+if the snapshots were ingested live. The next snapshot is read while the current one is being written.
+With --statistics sum_statistics is recalculated for the replayed hours at the end, including the older
+hours of rows published before the range.
+
+Usage:
+    python replay_snapshots.py "ORP MOST" "25.04.2024 00:00" "26.04.2024 00:00" [--archive DIR] [--statistics]
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from cons.CONF_INGEST import SNAPSHOT_ARCHIVE_DIR
+from cons.CONF_REGIONS import REGION_DB_CONFIGS
+from helpers import round_to_hour
+from queries.queries_functions import calculate_statistics_range, create_segments_natural_key
+from queries.queries_inserting_data import connect, extract_segments_from_jams
+from queries.queries_snapshot_archive import iter_snapshot_paths, read_snapshot
+from queries.queries_staging_data import ingest_feed_copy
+
+
+def replay(db_config, archive_dir, region, start, end, statistics=False):
+    paths = list(iter_snapshot_paths(archive_dir, region, start, end))
+    print(f"[{datetime.now()}] {len(paths)} snapshot(s) of {region} to replay")
+
+    conn = connect(db_config)
+    rows = 0
+    earliest_inserted = None
+    replay_start = time.perf_counter()
+    try:
+        with conn.cursor() as cursor, ThreadPoolExecutor(max_workers=1) as reader:
+            # ON CONFLICT of the segments merge needs the natural key
+            create_segments_natural_key(cursor)
+            conn.commit()
+
+            next_snapshot = reader.submit(read_snapshot, paths[0][1]) if paths else None
+            for i, (fetched_at, path) in enumerate(paths):
+                alerts, jams = next_snapshot.result()
+                if i + 1 < len(paths):
+                    next_snapshot = reader.submit(read_snapshot, paths[i + 1][1])
+
+                _, inserted_since, _ = ingest_feed_copy(cursor, alerts, jams, extract_segments_from_jams(jams),
+                                                     as_of=fetched_at)
+                if inserted_since is not None:
+                    earliest_inserted = min(earliest_inserted or inserted_since, inserted_since)
+                conn.commit()
+                rows += len(alerts) + len(jams)
+                print(f"[{datetime.now()}] Replayed snapshot {fetched_at}: {len(alerts)} alerts, {len(jams)} jams")
+
+            if statistics and paths:
+                # every hour touched by the replayed snapshots, from the earliest published_at of the inserted
+                # rows, the end rounded up
+                first_hour = round_to_hour(min(start, earliest_inserted or start))
+                calculate_statistics_range(cursor, first_hour,
+                                           round_to_hour(end - timedelta(microseconds=1)) + timedelta(hours=1))
+                conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - replay_start
+    print(f"[{datetime.now()}] Replay finished: {len(paths)} snapshot(s), {rows} rows in {elapsed:.2f} s "
+          f"({rows / elapsed if elapsed else 0:.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("region", choices=REGION_DB_CONFIGS.keys())
+    parser.add_argument("start", help="first snapshot time, 'DD.MM.YYYY HH:MM' (local time)")
+    parser.add_argument("end", help="end of the range (excluded), 'DD.MM.YYYY HH:MM' (local time)")
+    parser.add_argument("--archive", default=SNAPSHOT_ARCHIVE_DIR, help="archive directory")
+    parser.add_argument("--statistics", action="store_true", help="recalculate sum_statistics of the range")
+    args = parser.parse_args()
+
+    if not args.archive:
+        parser.error("no archive directory, set SNAPSHOT_ARCHIVE_DIR or use --archive")
+
+    start = datetime.strptime(args.start, "%d.%m.%Y %H:%M").astimezone()
+    end = datetime.strptime(args.end, "%d.%m.%Y %H:%M").astimezone()
+    replay(REGION_DB_CONFIGS[args.region], args.archive, args.region, start, end, statistics=args.statistics)
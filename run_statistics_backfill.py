@@ -0,0 +1,49 @@
+"""
+One-off recalculation of sum_statistics for all hours since the given time, the live ingest
+(ingest_waze_data.py) recalculates only the recent hours.
+
+By default all hours are calculated with one set-based statement, --per-hour uses the
+original loop with two queries per hour.
+
+Usage:
+    python run_statistics_backfill.py BRNO "25.04.2024 00:00" [--per-hour]
+    python run_statistics_backfill.py "ORP MOST" "25.04.2024 00:00"
+"""
+import argparse
+from datetime import datetime
+
+from cons.CONF_REGIONS import REGION_DB_CONFIGS
+from queries.QUERIES import DB_NOW_QUERY
+from queries.queries_functions import (run_statistics, get_statistics_watermark, set_statistics_watermark,
+                                       create_statistics_watermark_table)
+from queries.queries_inserting_data import connect
+
+def backfill(db_config, stat_time_str, set_based=True):
+    conn = connect(db_config)
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(DB_NOW_QUERY)
+            started_at = cursor.fetchone()[0]
+
+            # all full hours since stat_time_str, the open hour is handled by the live ingest
+            run_statistics(cursor, stat_time_str, set_based=set_based)
+
+            # the live ingest continues from here, unless it already ran in the meantime
+            create_statistics_watermark_table(cursor)
+            if get_statistics_watermark(cursor) is None:
+                set_statistics_watermark(cursor, started_at)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("region", choices=REGION_DB_CONFIGS.keys())
+    parser.add_argument("start", help="first hour, 'DD.MM.YYYY HH:MM'")
+    parser.add_argument("--per-hour", action="store_true", help="calculate hour by hour")
+    args = parser.parse_args()
+
+    print(f"[{datetime.now()}] Backfilling statistics for {args.region} since {args.start}")
+    backfill(REGION_DB_CONFIGS[args.region], args.start, set_based=not args.per_hour)
+    print(f"[{datetime.now()}] Backfill finished.")